@@ -6,8 +6,12 @@ from flask_mail import Mail
 from redis import Redis
 from .config import Config
 from flask_apscheduler import APScheduler
-from app.tasks.enrollment import check_enrollment_deadline
+from datetime import datetime
+from app.tasks.enrollment import sync_enrollment_deadline
+from app.tasks.logs import archive_old_logs
+from app.utils.leader import is_leader
 from .extensions import db, jwt, mail, scheduler, redis_client
+from app.utils.audit import init_audit
 
 def create_app():
     app = Flask(__name__)
@@ -15,6 +19,7 @@ def create_app():
     
     # 初始化插件
     db.init_app(app)
+    init_audit(app)
     jwt.init_app(app)
     mail.init_app(app)
     CORS(app)
@@ -23,11 +28,23 @@ def create_app():
     scheduler.init_app(app)
     
     # 添加定时任务
-    @scheduler.task('interval', id='check_enrollment_deadline', seconds=10)
-    def check_enrollment_task():
+    # 报到截止时由一次性任务处理，此处仅同步截止时间的变更，启动后立即执行一次
+    @scheduler.task('interval', id='sync_enrollment_deadline', seconds=60, next_run_time=datetime.now())
+    def sync_enrollment_task():
         with app.app_context():
-            check_enrollment_deadline()
+            sync_enrollment_deadline(app)
 
+    @scheduler.task('cron', id='archive_system_logs', hour=3, minute=0)
+    def archive_logs_task():
+        with app.app_context():
+            archive_old_logs()
+
+    # 定期续期领导者锁，领导者进程退出后其他进程在锁过期后接管
+    @scheduler.task('interval', id='scheduler_leader_heartbeat', seconds=max(app.config['SCHEDULER_LEADER_TTL'] // 3, 1))
+    def leader_heartbeat_task():
+        with app.app_context():
+            if app.config['SCHEDULER_LEADER_ELECTION']:
+                is_leader()
     
     scheduler.start()
     
@@ -24,4 +24,24 @@ class Config:
     # Redis配置
     REDIS_HOST = os.environ.get('REDIS_HOST') or 'localhost'
     REDIS_PORT = int(os.environ.get('REDIS_PORT') or 6379)
-    REDIS_PASSWORD = None  # 如果 Redis 没有设置密码，则为 None
\ No newline at end of file
+    REDIS_PASSWORD = None  # 如果 Redis 没有设置密码，则为 None
+
+    # 统计缓存配置
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL') or 60)  # 概览统计缓存秒数
+    COUNT_CACHE_TTL = int(os.environ.get('COUNT_CACHE_TTL') or 60)  # 游标分页总数缓存秒数
+    SETTINGS_CHECK_INTERVAL = float(os.environ.get('SETTINGS_CHECK_INTERVAL') or 1.0)  # 系统设置版本检查间隔秒数
+
+    # 定时任务选举配置，多进程部署时只有领导者进程执行定时任务
+    SCHEDULER_LEADER_ELECTION = os.environ.get('SCHEDULER_LEADER_ELECTION', '1') != '0'
+    SCHEDULER_LEADER_TTL = int(os.environ.get('SCHEDULER_LEADER_TTL') or 30)  # 领导者锁有效秒数
+
+    # 操作日志异步写入配置
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE') or 10000)  # 待写入日志上限
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE') or 500)  # 单次批量插入条数
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL') or 1.0)  # 后台刷新间隔秒数
+    AUDIT_WRITE_RETRIES = int(os.environ.get('AUDIT_WRITE_RETRIES') or 3)  # 批量写入失败重试次数
+
+    # 操作日志保留配置
+    LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS') or 180)  # 在线日志保留天数，超出后归档
+    LOG_ARCHIVE_RETENTION_DAYS = int(os.environ.get('LOG_ARCHIVE_RETENTION_DAYS') or 0)  # 归档保留天数，0 为永久保留
+    LOG_ARCHIVE_BATCH_SIZE = int(os.environ.get('LOG_ARCHIVE_BATCH_SIZE') or 5000)  # 每批归档条数
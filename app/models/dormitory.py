@@ -13,13 +13,22 @@ class DormitoryBuilding(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
-    def to_dict(self):
+    @staticmethod
+    def room_count_map():
+        """一次分组查询统计各宿舍楼的房间数"""
+        rows = db.session.query(
+            DormitoryRoom.building_id,
+            db.func.count(DormitoryRoom.id)
+        ).group_by(DormitoryRoom.building_id).all()
+        return dict(rows)
+
+    def to_dict(self, room_count=None):
         return {
             'id': self.id,
             'name': self.name,
             'gender': self.gender,
             'description': self.description,
-            'roomCount': len(self.rooms)
+            'roomCount': len(self.rooms) if room_count is None else room_count
         }
 
 class DormitoryRoom(db.Model):
@@ -30,17 +39,15 @@ class DormitoryRoom(db.Model):
     room_number = db.Column(db.String(20), nullable=False)  # 房间号
     building_id = db.Column(db.Integer, db.ForeignKey('dormitory_buildings.id'), nullable=False)
     capacity = db.Column(db.Integer, default=4)  # 房间容量
+    current_occupancy = db.Column(db.Integer, default=0, nullable=False)  # 当前入住人数，随分配/退宿同步维护
     description = db.Column(db.String(200))  # 描述
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
     @property
     def occupancy(self):
-        """计算当前入住人数"""
-        return DormitoryAssignment.query.filter_by(
-            room_id=self.id,
-            status='active'
-        ).count()
+        """当前入住人数"""
+        return self.current_occupancy or 0
 
     def to_dict(self):
         return {
@@ -3,14 +3,18 @@ from datetime import datetime
 
 class SystemLog(db.Model):
     __tablename__ = 'system_logs'
+    __table_args__ = (
+        db.Index('ix_system_logs_created_at', 'created_at'),
+        db.Index('ix_system_logs_type_created_at', 'type', 'created_at'),
+        db.Index('ix_system_logs_user_type_created_at', 'user_id', 'type', 'created_at'),
+    )
 
-    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
     type = db.Column(db.String(50))  # 操作类型
     content = db.Column(db.Text)  # 操作内容
     ip_address = db.Column(db.String(50))  # IP地址
-    created_at = db.Column(db.DateTime, default=datetime.now())
+    created_at = db.Column(db.DateTime, default=datetime.now)
     
 
     def to_dict(self):
@@ -21,4 +25,20 @@ class SystemLog(db.Model):
             'content': self.content,
             'ip_address': self.ip_address,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        } 
\ No newline at end of file
+        }
+
+
+class SystemLogArchive(db.Model):
+    """超过保留期限的操作日志归档表，保留原日志ID"""
+    __tablename__ = 'system_logs_archive'
+    __table_args__ = (
+        db.Index('ix_system_logs_archive_created_at', 'created_at'),
+        db.Index('ix_system_logs_archive_type_created_at', 'type', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer)  # 归档后不再约束用户外键
+    type = db.Column(db.String(50))
+    content = db.Column(db.Text)
+    ip_address = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime)
@@ -15,6 +15,7 @@ class User(db.Model):
     class_id = db.Column(db.Integer, db.ForeignKey('class_info.id', ondelete='SET NULL'), nullable=True)
     province = db.Column(db.String(50))
     is_active = db.Column(db.Boolean, default=True)
+    must_change_password = db.Column(db.Boolean, default=False)  # 批量导入的账号首次登录需修改密码
     created_at = db.Column(db.DateTime, default=datetime.now())
     updated_at = db.Column(db.DateTime, default=datetime.now(), onupdate=datetime.now())
     
@@ -33,6 +34,7 @@ class User(db.Model):
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
+        self.must_change_password = False
         
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -1,22 +1,39 @@
-from flask import Blueprint, jsonify, request, g, send_file
+from flask import Blueprint, jsonify, request, g, send_file, current_app, Response, stream_with_context
 from app.utils.decorators import admin_required
 from app.models.user import User
 from app.models.student import Student
 from app.models.teacher import Teacher
-from app.models.system_log import SystemLog
-from app.models.settings import Settings
+from app.models.system_log import SystemLog, SystemLogArchive
+from app.utils.audit import log_operation
+from app.utils.settings import get_settings as get_cached_settings, load_settings, notify_settings_changed
 from app.models.class_info import ClassInfo
+from app.models.dormitory import DormitoryBuilding, DormitoryRoom, DormitoryAssignment
 from app.extensions import db
-from sqlalchemy import or_, case, func, and_
+from sqlalchemy import or_, case, func, and_, insert
 from app.utils.excel import process_teacher_excel
 import os
-from app.utils.template import create_teacher_template
+from app.utils.template import get_import_template
 from datetime import datetime, timedelta
-from app.utils.template import create_student_template
+from io import BytesIO, StringIO
+import csv
 from app.utils.excel import process_student_excel
+from app.utils.ranking import move_major_rank
+from app.utils.stats import invalidate_overview_cache
+from app.tasks.imports import submit_import_job, get_import_job
+from app.tasks.enrollment import (
+    reset_enrollment_sweep, invalidate_enrollment_deadline, schedule_enrollment_deadline
+)
+from app.utils.dormitory import reserve_beds, invalidate_dormitory_cache
+from app.utils.vacancy import refresh_room_vacancy
+from app.utils.pagination import keyset_page, cached_count
+from app.utils.options import invalidate_options_cache
+from sqlalchemy.orm import contains_eager
 
 admin_bp = Blueprint('admin', __name__)
 
+LOG_EXPORT_BATCH_SIZE = 1000  # 归档日志导出时每批读取条数
+CURSOR_PAGE_MAX = 200  # 游标分页单页最大条数
+
 # 学生管理
 @admin_bp.route('/students', methods=['GET'])
 @admin_required
@@ -45,13 +62,20 @@ def get_students():
             
         if status:
             query = query.filter(Student.status == status)
+        query = query.options(contains_eager(User.student_profile))
             
-        # 分页
-        pagination = query.paginate(page=page, per_page=per_page)
+        # 分页，传入 cursor 参数时使用游标分页
+        if 'cursor' in request.args:
+            per_page = min(max(per_page, 1), CURSOR_PAGE_MAX)
+            items, next_cursor = keyset_page(query, [User.id], request.args.get('cursor'), per_page)
+            total = cached_count(query) if request.args.get('withTotal') else None
+        else:
+            pagination = query.paginate(page=page, per_page=per_page)
+            items, next_cursor, total = pagination.items, None, pagination.total
         
         # 转换为列表
         students = []
-        for user in pagination.items:
+        for user in items:
             student_data = user.to_dict()
             student = user.student_profile
             if student:
@@ -68,10 +92,16 @@ def get_students():
             'success': True,
             'data': {
                 'list': students,
-                'total': pagination.total
+                'total': total,
+                'nextCursor': next_cursor
             }
         })
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         print(f"Get students error: {str(e)}")
         return jsonify({
@@ -103,12 +133,17 @@ def update_student(id):
             user.contact = data['contact']
             
         # 更新学生特有信息
+        old_major = student.major
         if 'major' in data:
             student.major = data['major']
         if 'status' in data:  # 添加状态更新
             student.status = data['status']
             
         db.session.commit()
+
+        # 专业变更时同步专业排名索引
+        if student.major != old_major and student.score:
+            move_major_rank(student.id, old_major, student.major, student.score[0].total_score)
         
         # 返回更新后的完整信息
         student_data = user.to_dict()
@@ -119,15 +154,16 @@ def update_student(id):
             'admission_date': student.admission_date.strftime('%Y-%m-%d') if student.admission_date else None,
             'graduation_date': student.graduation_date.strftime('%Y-%m-%d') if student.graduation_date else None
         })
+
         # 记录操作日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='update_student',
             content=f'更新学生信息: {user.name}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_overview_cache()
+        reset_enrollment_sweep()
         
         return jsonify({
             'success': True,
@@ -158,19 +194,21 @@ def delete_student(id):
                 'message': '学生不存在'
             }), 404
             
-        # 记录删除日志
-        log = SystemLog(
-            user_id=g.user_id,
-            type='delete_student',
-            content=f'删除学生: {user.name}（学号：{student.student_id}）',
-            ip_address=request.remote_addr
-        )
+        log_content = f'删除学生: {user.name}（学号：{student.student_id}）'
         
         # 删除学生信息和用户信息
         db.session.delete(student)
         db.session.delete(user)
-        db.session.add(log)
         db.session.commit()
+
+        # 记录删除日志
+        log_operation(
+            user_id=g.user_id,
+            type='delete_student',
+            content=log_content,
+            ip_address=request.remote_addr
+        )
+        invalidate_overview_cache()
         
         return jsonify({
             'success': True,
@@ -206,26 +244,103 @@ def get_system_logs():
         if log_type:
             query = query.filter(SystemLog.type == log_type)
             
-        pagination = query.order_by(SystemLog.created_at.desc()).paginate(
-            page=page,
-            per_page=page_size,
-            error_out=False
-        )
+        # 传入 cursor 参数时按 (created_at, id) 倒序游标分页
+        if 'cursor' in request.args:
+            page_size = min(max(page_size, 1), CURSOR_PAGE_MAX)
+            items, next_cursor = keyset_page(
+                query,
+                [SystemLog.created_at, SystemLog.id],
+                request.args.get('cursor'),
+                page_size,
+                descending=True
+            )
+            total = cached_count(query) if request.args.get('withTotal') else None
+        else:
+            pagination = query.order_by(SystemLog.created_at.desc()).paginate(
+                page=page,
+                per_page=page_size,
+                error_out=False
+            )
+            items, next_cursor, total = pagination.items, None, pagination.total
         
         return jsonify({
             'success': True,
             'data': {
-                'list': [log.to_dict() for log in pagination.items],
-                'total': pagination.total
+                'list': [log.to_dict() for log in items],
+                'total': total,
+                'nextCursor': next_cursor
             }
         })
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
             'message': str(e)
         }), 500
 
+@admin_bp.route('/logs/archive/export', methods=['GET'])
+@admin_required
+def export_archived_logs():
+    """以CSV流式导出归档的操作日志"""
+    try:
+        start_date = request.args.get('startDate')
+        end_date = request.args.get('endDate')
+        log_type = request.args.get('type')
+
+        query = SystemLogArchive.query
+        if start_date:
+            query = query.filter(SystemLogArchive.created_at >= start_date)
+        if end_date:
+            query = query.filter(SystemLogArchive.created_at <= end_date)
+        if log_type:
+            query = query.filter(SystemLogArchive.type == log_type)
+
+        def generate():
+            buffer = StringIO()
+            writer = csv.writer(buffer)
+            # 带 BOM 便于 Excel 正确识别中文
+            writer.writerow(['\ufeffID', '用户ID', '操作类型', '操作内容', 'IP地址', '操作时间'])
+            after_id = 0
+            while True:
+                # 按主键游标分批读取，避免一次加载全部归档
+                batch = query.filter(SystemLogArchive.id > after_id)\
+                    .order_by(SystemLogArchive.id)\
+                    .limit(LOG_EXPORT_BATCH_SIZE)\
+                    .all()
+                for log in batch:
+                    writer.writerow([
+                        log.id,
+                        log.user_id or '',
+                        log.type,
+                        log.content,
+                        log.ip_address,
+                        log.created_at.strftime('%Y-%m-%d %H:%M:%S') if log.created_at else ''
+                    ])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+                if len(batch) < LOG_EXPORT_BATCH_SIZE:
+                    break
+                after_id = batch[-1].id
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=system_logs_archive.csv'}
+        )
+
+    except Exception as e:
+        print(f"Export archived logs error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
 
 
 @admin_bp.route('/teachers', methods=['GET'])
@@ -254,21 +369,33 @@ def get_teacher_list():
         if department:
             query = query.filter(User.department == department)
 
-        # 分页
-        pagination = query.paginate(
-            page=page,
-            per_page=page_size,
-            error_out=False
-        )
+        # 分页，传入 cursor 参数时使用游标分页
+        if 'cursor' in request.args:
+            page_size = min(max(page_size, 1), CURSOR_PAGE_MAX)
+            items, next_cursor = keyset_page(query, [User.id], request.args.get('cursor'), page_size)
+            total = cached_count(query) if request.args.get('withTotal') else None
+        else:
+            pagination = query.paginate(
+                page=page,
+                per_page=page_size,
+                error_out=False
+            )
+            items, next_cursor, total = pagination.items, None, pagination.total
 
         return jsonify({
             'success': True,
             'data': {
-                'list': [user.to_dict() for user in pagination.items],
-                'total': pagination.total
+                'list': [user.to_dict() for user in items],
+                'total': total,
+                'nextCursor': next_cursor
             }
         })
 
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -312,16 +439,15 @@ def update_teacher(id):
             if 'research_area' in profile_data:
                 teacher.research_area = profile_data['research_area']
         
+        db.session.commit()
+
         # 记录操作日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='update_teacher',
             content=f'更新教师信息: {user.name}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        
-        db.session.commit()
         
         return jsonify({
             'success': True,
@@ -357,19 +483,21 @@ def delete_teacher(id):
             for class_info in managed_classes:
                 class_info.teacher_id = None
             
-        # 记录删除日志
-        log = SystemLog(
-            user_id=g.user_id,
-            type='delete_teacher',
-            content=f'删除教师: {user.name}',
-            ip_address=request.remote_addr
-        )
+        log_content = f'删除教师: {user.name}'
         
         # 先删除教师信息，再删除用户信息
         db.session.delete(teacher)
         db.session.delete(user)
-        db.session.add(log)
         db.session.commit()
+
+        # 记录删除日志
+        log_operation(
+            user_id=g.user_id,
+            type='delete_teacher',
+            content=log_content,
+            ip_address=request.remote_addr
+        )
+        invalidate_overview_cache()
         
         return jsonify({
             'success': True,
@@ -390,11 +518,7 @@ def delete_teacher(id):
 def get_settings():
     """获取系统设置"""
     try:
-        settings = Settings.query.first()
-        if not settings:
-            settings = Settings()  # 创建默认设置
-            db.session.add(settings)
-            db.session.commit()
+        settings = get_cached_settings()
             
         return jsonify({
             'success': True,
@@ -414,24 +538,24 @@ def update_settings():
     """更新系统设置"""
     try:
         data = request.get_json()
-        settings = Settings.query.first()
-        
-        if not settings:
-            settings = Settings()
-            db.session.add(settings)
+        settings = load_settings()
         
         # 更新设置
         settings.update_from_dict(data)
         
+        db.session.commit()
+        notify_settings_changed()
+
         # 记录操作日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='update_settings',
             content=f'更新系统设置',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_enrollment_deadline()
+        invalidate_options_cache()
+        schedule_enrollment_deadline(current_app._get_current_object(), settings.enrollment_deadline)
         
         return jsonify({
             'success': True,
@@ -476,15 +600,16 @@ def create_teacher():
         db.session.add(user)
         db.session.add(teacher)
         
+        db.session.commit()
+
         # 记录操作日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='create_teacher',
             content=f'创建教师账号: {user.username}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_overview_cache()
         
         return jsonify({
             'success': True,
@@ -527,15 +652,17 @@ def create_class():
         
         db.session.add(class_info)
         
+        db.session.commit()
+
         # 记录操作日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='create_class',
             content=f'创建班级: {class_info.name}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_overview_cache()
+        invalidate_options_cache()
         
         return jsonify({
             'success': True,
@@ -568,17 +695,33 @@ def import_teachers():
                 'message': '请上传Excel文件'
             }), 400
 
+        # 异步模式：立即返回任务ID，后台线程执行导入
+        if request.args.get('async') in ('1', 'true'):
+            job_id = submit_import_job(
+                current_app._get_current_object(),
+                'teachers',
+                file.read(),
+                g.user_id,
+                request.remote_addr
+            )
+            return jsonify({
+                'success': True,
+                'message': '导入任务已提交',
+                'data': {'jobId': job_id}
+            }), 202
+
         result = process_teacher_excel(file)
         
+        db.session.commit()
+
         # 记录操作日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='import_teachers',
             content=f'批量导入教师: 成功{result["success"]}条，失败{result["failed"]}条',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_overview_cache()
 
         return jsonify({
             'success': True,
@@ -598,9 +741,8 @@ def import_teachers():
 def download_teacher_template():
     """下载教师导入模板"""
     try:
-        template_path = create_teacher_template()
         return send_file(
-            template_path,
+            BytesIO(get_import_template('teacher')),
             as_attachment=True,
             download_name='教师导入模板.xlsx',
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
@@ -618,7 +760,6 @@ def download_teacher_template():
 def get_enrollment_stats():
     """获取新生报到统计"""
     try:
-        settings = get_settings()
         current_year = datetime.now().year
         
         # 获取总人数
@@ -762,33 +903,61 @@ def assign_dormitories():
                 'message': '缺少必要参数'
             }), 400
             
-        # 检查宿舍是否可用
-        existing = Student.query.filter_by(
-            dormitory_building=building,
-            dormitory_room=room
-        ).count()
-        
-        if existing >= 4:  # 假设每个宿舍最多4人
+        # 查找宿舍房间
+        room = DormitoryRoom.query\
+            .join(DormitoryBuilding, DormitoryRoom.building_id == DormitoryBuilding.id)\
+            .filter(
+                DormitoryBuilding.name == building,
+                DormitoryRoom.room_number == room
+            ).first()
+        if not room:
             return jsonify({
                 'success': False,
-                'message': '该宿舍已满'
+                'message': '宿舍不存在'
+            }), 404
+
+        # 排除已有宿舍的学生，并检查性别
+        has_room = db.session.query(DormitoryAssignment.id).filter(
+            DormitoryAssignment.student_id == Student.id,
+            DormitoryAssignment.status == 'active'
+        ).exists()
+        students = db.session.query(Student.id, User.gender)\
+            .join(User, Student.user_id == User.id)\
+            .filter(Student.id.in_(student_ids), ~has_room)\
+            .all()
+        if any(gender != room.building.gender for _, gender in students):
+            return jsonify({
+                'success': False,
+                'message': '学生性别与宿舍楼不匹配'
             }), 400
-            
+
+        # 原子占用床位
+        if not students or not reserve_beds(room.id, len(students)):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': '该宿舍已满' if students else '没有可分配的学生'
+            }), 400
+
         # 分配宿舍
-        for student_id in student_ids:
-            student = Student.query.get(student_id)
-            if student:
-                student.dormitory_building = building
-                student.dormitory_room = room
+        db.session.execute(insert(DormitoryAssignment), [{
+            'student_id': student_id,
+            'room_id': room.id,
+            'check_in_date': datetime.now(),
+            'status': 'active'
+        } for student_id, _ in students])
+
+        db.session.commit()
+
         # 记录操作日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='assign_dormitories',
-            content=f'批量分配宿舍: {building} {room}',
+            content=f'批量分配宿舍: {building} {room.room_number}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_dormitory_cache()
+        refresh_room_vacancy(room.id)
         
         return jsonify({
             'success': True,
@@ -807,9 +976,8 @@ def assign_dormitories():
 def get_student_template():
     """获取学生导入模板"""
     try:
-        template_path = create_student_template()
         return send_file(
-            template_path,
+            BytesIO(get_import_template('student')),
             as_attachment=True,
             download_name='student_import_template.xlsx',
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
@@ -838,17 +1006,34 @@ def import_students():
                 'message': '请上传Excel文件(.xlsx)'
             }), 400
             
+        # 异步模式：立即返回任务ID，后台线程执行导入
+        if request.args.get('async') in ('1', 'true'):
+            job_id = submit_import_job(
+                current_app._get_current_object(),
+                'students',
+                file.read(),
+                g.user_id,
+                request.remote_addr
+            )
+            return jsonify({
+                'success': True,
+                'message': '导入任务已提交',
+                'data': {'jobId': job_id}
+            }), 202
+
         result = process_student_excel(file)
         
+        db.session.commit()
+
         # 记录导入日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='import_students',
             content=f'导入学生: 成功{result["success"]}条，失败{result["failed"]}条',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_overview_cache()
+        reset_enrollment_sweep()
         
         return jsonify({
             'success': True,
@@ -859,4 +1044,27 @@ def import_students():
         return jsonify({
             'success': False,
             'message': str(e)
-        }), 500 
\ No newline at end of file
+        }), 500 
+
+@admin_bp.route('/import-jobs/<job_id>', methods=['GET'])
+@admin_required
+def get_import_job_status(job_id):
+    """查询导入任务进度"""
+    try:
+        job = get_import_job(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'message': '导入任务不存在或已过期'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': job
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
@@ -1,7 +1,6 @@
 from flask import Blueprint, request, jsonify
 from app.models.user import User
 from app.models.student import Student
-from app.models.settings import Settings
 from app.extensions import db
 from app.utils.email import send_verification_email, verify_email_code
 from app.utils.settings import get_settings
@@ -12,10 +11,12 @@ from flask_jwt_extended import (
     get_jwt_identity,
     jwt_required
 )
-from werkzeug.security import generate_password_hash
-from app.models.system_log import SystemLog
+from app.utils.audit import log_operation
+from app.utils.decorators import PASSWORD_CHANGE_CLAIM
 from datetime import datetime
 from app.extensions import jwt
+from app.utils.stats import invalidate_overview_cache
+from app.tasks.enrollment import reset_enrollment_sweep
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -102,14 +103,14 @@ def register():
             db.session.commit()
             
             # 记录注册日志
-            log = SystemLog(
+            log_operation(
                 user_id=user.id,
                 type='register',
                 content=f'新用户注册: {user.username}',
                 ip_address=request.remote_addr
             )
-            db.session.add(log)
-            db.session.commit()
+            invalidate_overview_cache()
+            reset_enrollment_sweep()
             
             print("User registered successfully:", user.id)  # 添加调试日志
             return jsonify({"message": "Registration successful"}), 201
@@ -123,6 +124,10 @@ def register():
         print("Registration error:", str(e))  # 添加调试日志
         return jsonify({"message": str(e)}), 500
 
+def _access_claims(user):
+    """访问令牌的附加声明"""
+    return {PASSWORD_CHANGE_CLAIM: True} if user.must_change_password else {}
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """用户登录"""
@@ -140,25 +145,24 @@ def login():
         if not user.is_active:
             return jsonify({"message": "Account is not activated"}), 401
             
-        # 生成访问令牌和刷新令牌
+        # 生成访问令牌和刷新令牌，使用初始密码的账号在访问令牌中标记需修改密码
         access_token = create_access_token(identity={
             'user_id': user.id,
             'role': user.role
-        })
+        }, additional_claims=_access_claims(user))
         refresh_token = create_refresh_token(identity={
             'user_id': user.id,
             'role': user.role
         })
         
         # 记录登录日志
-        log = SystemLog(
+        log_operation(
             user_id=user.id,
             type='login',
             content=f'用户登录: {user.username}',
-            ip_address=request.remote_addr
+            ip_address=request.remote_addr,
+            sync=True  # 上次登录时间接口依赖本次登录记录已落库
         )
-        db.session.add(log)
-        db.session.commit()
         
         return jsonify({
             "message": "登录成功",
@@ -170,7 +174,8 @@ def login():
                 "email": user.email,
                 "role": user.role,
                 "name": user.name
-            }
+            },
+            "mustChangePassword": bool(user.must_change_password)
         }), 200
     except Exception as e:
         return jsonify({"message": str(e)}), 500
@@ -181,7 +186,11 @@ def refresh():
     """刷新访问令牌"""
     try:
         current_user = get_jwt_identity()
-        access_token = create_access_token(identity=current_user)
+        # 按数据库中的最新状态决定是否仍需修改密码
+        user = User.query.get(current_user['user_id'])
+        if not user or not user.is_active:
+            return jsonify({"message": "用户不存在或已停用"}), 401
+        access_token = create_access_token(identity=current_user, additional_claims=_access_claims(user))
         return jsonify({
             "access_token": access_token
         }), 200
@@ -247,17 +256,16 @@ def reset_password():
             }), 400
             
         # 更新密码
-        user.password_hash = generate_password_hash(new_password)
+        user.set_password(new_password)
         db.session.commit()
+
         # 记录重置密码日志
-        log = SystemLog(
+        log_operation(
             user_id=user.id,
             type='reset_password',
             content=f'重置密码: {user.username}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
         return jsonify({
             "success": True,
             "message": "密码重置成功，请使用新密码登录"
@@ -274,7 +282,7 @@ def reset_password():
 
 def generate_student_id():
     """生成学号：年份(4位) + 随机数(4位)"""
-    settings = Settings.query.first()
+    settings = get_settings()
     year = settings.student_id_prefix
     # 查找当前年份最大学号
 
@@ -4,8 +4,15 @@ from app.utils.decorators import admin_required
 from app.models.dormitory import DormitoryBuilding, DormitoryRoom, DormitoryAssignment
 from app.models.student import Student
 from app.models.user import User
-from app.models.system_log import SystemLog
-from datetime import datetime
+from app.utils.audit import log_operation
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from redis.exceptions import LockError
+from app.utils.dormitory import (
+    reserve_beds, release_beds, end_assignment, recount_room_occupancy, allocate_rooms,
+    allocation_lock, batch_checkout, batch_change_rooms, get_building_summary, invalidate_dormitory_cache
+)
+from app.utils.vacancy import find_vacant_rooms, refresh_room_vacancy, invalidate_vacancy_index
 
 dormitory_bp = Blueprint('dormitory', __name__)
 
@@ -15,9 +22,10 @@ def get_buildings():
     """获取所有宿舍楼"""
     try:
         buildings = DormitoryBuilding.query.all()
+        room_counts = DormitoryBuilding.room_count_map()
         return jsonify({
             'success': True,
-            'data': [building.to_dict() for building in buildings]
+            'data': [building.to_dict(room_counts.get(building.id, 0)) for building in buildings]
         })
     except Exception as e:
         return jsonify({
@@ -25,6 +33,22 @@ def get_buildings():
             'message': str(e)
         }), 500
 
+@dormitory_bp.route('/buildings/summary', methods=['GET'])
+@admin_required
+def get_buildings_summary():
+    """获取各宿舍楼床位及入住汇总"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': get_building_summary()
+        })
+    except Exception as e:
+        print(f"Get buildings summary error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
 @dormitory_bp.route('/buildings', methods=['POST'])
 @admin_required
 def create_building():
@@ -38,15 +62,17 @@ def create_building():
         )
         db.session.add(building)
         
+        db.session.commit()
+
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='create_building',
             content=f'创建宿舍楼: {building.name}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_dormitory_cache()
+        invalidate_vacancy_index()
         
         return jsonify({
             'success': True,
@@ -105,6 +131,8 @@ def create_room():
         )
         db.session.add(room)
         db.session.commit()
+        invalidate_dormitory_cache()
+        refresh_room_vacancy(room.id)
 
         return jsonify({
             'success': True,
@@ -131,7 +159,10 @@ def create_room():
 def get_rooms(building_id):
     """获取指定宿舍楼的所有房间"""
     try:
-        rooms = DormitoryRoom.query.filter_by(building_id=building_id).all()
+        rooms = DormitoryRoom.query\
+            .options(joinedload(DormitoryRoom.building))\
+            .filter_by(building_id=building_id)\
+            .all()
         return jsonify({
             'success': True,
             'data': [room.to_dict() for room in rooms]
@@ -142,6 +173,27 @@ def get_rooms(building_id):
             'message': str(e)
         }), 500
 
+@dormitory_bp.route('/vacant-rooms', methods=['GET'])
+@admin_required
+def get_vacant_rooms():
+    """查找有空床位的房间"""
+    try:
+        building_id = request.args.get('buildingId', type=int)
+        gender = request.args.get('gender')
+        min_beds = request.args.get('minBeds', 1, type=int)
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+
+        return jsonify({
+            'success': True,
+            'data': find_vacant_rooms(gender, building_id, min_beds, limit)
+        })
+    except Exception as e:
+        print(f"Get vacant rooms error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
 @dormitory_bp.route('/assign', methods=['POST'])
 @admin_required
 def assign_room():
@@ -161,8 +213,9 @@ def assign_room():
                 'message': '学生性别与宿舍楼不匹配'
             }), 400
             
-        # 检查房间容量
-        if len(room.residents) >= room.capacity:
+        # 原子占用床位，房间已满时失败
+        if not reserve_beds(room_id):
+            db.session.rollback()
             return jsonify({
                 'success': False,
                 'message': '该宿舍已满'
@@ -175,14 +228,15 @@ def assign_room():
         )
         db.session.add(assignment)
         
-        log = SystemLog(
+        db.session.commit()
+        log_operation(
             user_id=g.user_id,
             type='assign_room',
             content=f'分配宿舍: {student.user.name} -> {room.building.name}-{room.room_number}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_dormitory_cache()
+        refresh_room_vacancy(room_id)
         
         return jsonify({
             'success': True,
@@ -195,6 +249,59 @@ def assign_room():
             'message': str(e)
         }), 500
 
+@dormitory_bp.route('/auto-assign', methods=['POST'])
+@admin_required
+def auto_assign_rooms():
+    """批量自动分配宿舍"""
+    try:
+        data = request.get_json() or {}
+        building_id = data.get('buildingId')
+        group_by = data.get('groupBy')
+
+        if group_by not in (None, 'major', 'class'):
+            return jsonify({
+                'success': False,
+                'message': '分组方式只能为 major 或 class'
+            }), 400
+
+        if building_id and not DormitoryBuilding.query.get(building_id):
+            return jsonify({
+                'success': False,
+                'message': '宿舍楼不存在'
+            }), 404
+
+        # 串行执行自动分配，持有锁直到事务提交
+        with allocation_lock():
+            result = allocate_rooms(building_id=building_id, group_by=group_by)
+            db.session.commit()
+
+        log_operation(
+            user_id=g.user_id,
+            type='auto_assign_rooms',
+            content=f'自动分配宿舍: 分配{result["assigned"]}人，{result["rooms"]}间房，未分配{result["unassigned"]}人',
+            ip_address=request.remote_addr
+        )
+        invalidate_dormitory_cache()
+        invalidate_vacancy_index()
+
+        return jsonify({
+            'success': True,
+            'message': '自动分配完成',
+            'data': result
+        })
+    except LockError:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': '其他自动分配正在进行，请稍后重试'
+        }), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
 @dormitory_bp.route('/unassigned-students', methods=['GET'])
 @admin_required
 def get_unassigned_students():
@@ -209,47 +316,62 @@ def get_unassigned_students():
             
         # 获取宿舍楼性别
         building = DormitoryBuilding.query.get_or_404(building_id)
-        print(f"Building gender: {building.gender}")  # 打印宿舍楼性别
-        
-        # 获取已分配宿舍的学生ID
-        assigned_ids = db.session.query(DormitoryAssignment.student_id)\
-            .filter(DormitoryAssignment.status == 'active').all()
-        assigned_ids = [id[0] for id in assigned_ids]
-        print(f"Assigned student IDs: {assigned_ids}")  # 打印已分配宿舍的学生ID
-        
-        # 查询所有已报到的学生
-        all_reported = db.session.query(Student, User)\
-            .join(User)\
+        search = request.args.get('search', '')
+
+        # 已报到、性别匹配且没有在住分配记录的学生（NOT EXISTS 反连接）
+        has_room = db.session.query(DormitoryAssignment.id).filter(
+            DormitoryAssignment.student_id == Student.id,
+            DormitoryAssignment.status == 'active'
+        ).exists()
+        query = db.session.query(
+            Student.id,
+            Student.student_id,
+            Student.major,
+            User.name,
+            User.gender
+        ).join(User, Student.user_id == User.id)\
             .filter(
                 Student.status == 'reported',
-                User.gender == building.gender
-            ).all()
-        print(f"Total reported students with matching gender: {len(all_reported)}")  # 打印符合条件的学生总数
-        
-        # 查询未分配宿舍且性别匹配的学生
-        students = db.session.query(Student, User)\
-            .join(User)\
-            .filter(
-                ~Student.id.in_(assigned_ids) if assigned_ids else True,  # 如果没有已分配的学生，不使用 in_ 条件
                 User.gender == building.gender,
-                Student.status == 'reported'
-            ).all()
-        
-        print(f"Unassigned students found: {len(students)}")  # 打印未分配宿舍的学生数量
-        db.session.commit()
-        student_list = [{
-            'id': student.id,
-            'name': user.name,
-            'studentId': student.student_id,
-            'major': student.major,
-            'gender': user.gender
-        } for student, user in students]
-        
+                ~has_room
+            )
+
+        if search:
+            query = query.filter(or_(
+                User.name.like(f'%{search}%'),
+                Student.student_id.like(f'%{search}%')
+            ))
+        query = query.order_by(Student.id)
+
+        def to_item(row):
+            return {
+                'id': row.id,
+                'name': row.name,
+                'studentId': row.student_id,
+                'major': row.major,
+                'gender': row.gender
+            }
+
+        # 未传分页参数时保持原有的列表返回格式
+        if 'page' not in request.args:
+            return jsonify({
+                'success': True,
+                'data': [to_item(row) for row in query.all()]
+            })
+
+        page = max(request.args.get('page', 1, type=int), 1)
+        page_size = min(max(request.args.get('pageSize', 20, type=int), 1), 200)
+        total = query.order_by(None).count()
+        rows = query.offset((page - 1) * page_size).limit(page_size).all()
+
         return jsonify({
             'success': True,
-            'data': student_list
+            'data': {
+                'list': [to_item(row) for row in rows],
+                'total': total
+            }
         })
-        
+
     except Exception as e:
         print(f"Error in get_unassigned_students: {str(e)}")
         return jsonify({
@@ -337,15 +459,17 @@ def update_building(building_id):
             building.gender = data['gender']
         if 'description' in data:
             building.description = data['description']
+        db.session.commit()
+
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='update_building',
             content=f'更新宿舍楼: {building.name}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_dormitory_cache()
+        invalidate_vacancy_index()
         
         return jsonify({
             'success': True,
@@ -379,18 +503,22 @@ def delete_building(building_id):
                 'message': '该宿舍楼还有学生入住，无法删除'
             }), 400
             
+        log_content = f'删除宿舍楼: {building.name}'
+
         # 删除所有房间
         DormitoryRoom.query.filter_by(building_id=building_id).delete()
         db.session.delete(building)
+        db.session.commit()
+
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='delete_building',
-            content=f'删除宿舍楼: {building.name}',
+            content=log_content,
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_dormitory_cache()
+        invalidate_vacancy_index()
         
         return jsonify({
             'success': True,
@@ -404,6 +532,28 @@ def delete_building(building_id):
             'message': str(e)
         }), 500
 
+@dormitory_bp.route('/buildings/<int:building_id>/recount', methods=['POST'])
+@admin_required
+def recount_building_occupancy(building_id):
+    """根据分配记录校准宿舍楼各房间入住人数"""
+    try:
+        building = DormitoryBuilding.query.get_or_404(building_id)
+        recount_room_occupancy(building.id)
+        invalidate_dormitory_cache()
+        invalidate_vacancy_index()
+
+        return jsonify({
+            'success': True,
+            'message': '入住人数校准完成'
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
 @dormitory_bp.route('/rooms/<int:room_id>', methods=['PUT'])
 @admin_required
 def update_room(room_id):
@@ -426,11 +576,7 @@ def update_room(room_id):
             
         if 'capacity' in data:
             # 检查新容量是否小于当前入住人数
-            current_occupancy = DormitoryAssignment.query.filter_by(
-                room_id=room_id,
-                status='active'
-            ).count()
-            if data['capacity'] < current_occupancy:
+            if data['capacity'] < room.occupancy:
                 return jsonify({
                     'success': False,
                     'message': '新容量小于当前入住人数'
@@ -439,15 +585,17 @@ def update_room(room_id):
             
         if 'description' in data:
             room.description = data['description']
+        db.session.commit()
+
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='update_room',
             content=f'更新宿舍房间: {room.building.name}-{room.room_number}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_dormitory_cache()
+        refresh_room_vacancy(room.id)
         
         return jsonify({
             'success': True,
@@ -478,16 +626,19 @@ def delete_room(room_id):
                 'message': '该房间还有学生入住，无法删除'
             }), 400
             
+        log_content = f'删除宿舍房间: {room.building.name}-{room.room_number}'
         db.session.delete(room)
+        db.session.commit()
+
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='delete_room',
-            content=f'删除宿舍房间: {room.building.name}-{room.room_number}',
+            content=log_content,
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_dormitory_cache()
+        invalidate_vacancy_index()
         
         return jsonify({
             'success': True,
@@ -508,24 +659,26 @@ def checkout(assignment_id):
     try:
         assignment = DormitoryAssignment.query.get_or_404(assignment_id)
         
-        if assignment.status != 'active':
+        # 条件更新状态，并发退宿同一记录时只释放一次床位
+        if not end_assignment(assignment_id):
+            db.session.rollback()
             return jsonify({
                 'success': False,
                 'message': '该学生已退宿'
             }), 400
-            
-        assignment.status = 'inactive'
-        assignment.check_out_date = datetime.now()
+        release_beds(assignment.room_id)
         
+        db.session.commit()
+
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='checkout',
             content=f'学生退宿: {assignment.student.user.name} 从 {assignment.room.building.name}-{assignment.room.room_number}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_dormitory_cache()
+        refresh_room_vacancy(assignment.room_id)
         
         return jsonify({
             'success': True,
@@ -555,12 +708,11 @@ def change_room(assignment_id):
             
         assignment = DormitoryAssignment.query.get_or_404(assignment_id)
         new_room = DormitoryRoom.query.get_or_404(new_room_id)
-        
-        # 检查新宿舍是否已满
-        if len(new_room.residents) >= new_room.capacity:
+
+        if assignment.status != 'active':
             return jsonify({
                 'success': False,
-                'message': '新宿舍已满'
+                'message': '该学生已退宿'
             }), 400
             
         # 检查性别是否匹配
@@ -569,28 +721,42 @@ def change_room(assignment_id):
                 'success': False,
                 'message': '学生性别与新宿舍楼不匹配'
             }), 400
+
+        # 条件更新原记录状态，并发调宿同一记录时只有一个请求继续
+        if not end_assignment(assignment_id):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': '该学生已退宿'
+            }), 400
+
+        # 原子占用新宿舍床位，已满时失败并回滚原记录状态
+        if not reserve_beds(new_room_id):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': '新宿舍已满'
+            }), 400
+        release_beds(assignment.room_id)
             
         # 创建新的分配记录
         new_assignment = DormitoryAssignment(
             student_id=assignment.student_id,
             room_id=new_room_id
         )
-        
-        # 更新原记录状态
-        assignment.status = 'inactive'
-        assignment.check_out_date = datetime.now()
-        
         db.session.add(new_assignment)
         
+        db.session.commit()
+
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='change_room',
             content=f'调整宿舍: {assignment.student.user.name} 从 {assignment.room.building.name}-{assignment.room.room_number} 到 {new_room.building.name}-{new_room.room_number}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_dormitory_cache()
+        refresh_room_vacancy(assignment.room_id, new_room_id)
         
         return jsonify({
             'success': True,
@@ -602,4 +768,98 @@ def change_room(assignment_id):
         return jsonify({
             'success': False,
             'message': str(e)
-        }), 500 
\ No newline at end of file
+        }), 500
+
+@dormitory_bp.route('/assignments/batch-checkout', methods=['POST'])
+@admin_required
+def batch_checkout_assignments():
+    """批量退宿"""
+    try:
+        data = request.get_json() or {}
+        assignment_ids = data.get('assignmentIds') or []
+        if not isinstance(assignment_ids, list) or not assignment_ids:
+            return jsonify({
+                'success': False,
+                'message': '请选择需要退宿的分配记录'
+            }), 400
+
+        result = batch_checkout(assignment_ids)
+
+        db.session.commit()
+
+        # 记录日志
+        log_operation(
+            user_id=g.user_id,
+            type='batch_checkout',
+            content=f'批量退宿: 成功{result["checkedOut"]}人，跳过{result["skipped"]}条',
+            ip_address=request.remote_addr
+        )
+        invalidate_dormitory_cache()
+        refresh_room_vacancy(*result['roomIds'])
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'checkedOut': result['checkedOut'],
+                'skipped': result['skipped']
+            }
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Batch checkout error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+@dormitory_bp.route('/assignments/batch-change', methods=['POST'])
+@admin_required
+def batch_change_rooms_route():
+    """批量调整宿舍"""
+    try:
+        data = request.get_json() or {}
+        moves = data.get('moves') or []
+        if not isinstance(moves, list) or not moves:
+            return jsonify({
+                'success': False,
+                'message': '请提供需要调整的宿舍'
+            }), 400
+        try:
+            moves = [(int(move['assignmentId']), int(move['newRoomId'])) for move in moves]
+        except (KeyError, TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': '调整数据格式错误'
+            }), 400
+
+        result = batch_change_rooms(moves)
+
+        db.session.commit()
+
+        # 记录日志
+        log_operation(
+            user_id=g.user_id,
+            type='batch_change_room',
+            content=f'批量调整宿舍: 成功{result["changed"]}人，失败{result["failed"]}人',
+            ip_address=request.remote_addr
+        )
+        invalidate_dormitory_cache()
+        refresh_room_vacancy(*result['roomIds'])
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'changed': result['changed'],
+                'failed': result['failed'],
+                'errors': result['errors']
+            }
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Batch change rooms error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
@@ -1,21 +1,19 @@
-from flask import Blueprint, jsonify, g, current_app
+from flask import Blueprint, jsonify, g, current_app, request, Response, stream_with_context
 from app.models.user import User
 from app.models.class_info import ClassInfo
 from app.models.system_log import SystemLog
 from app.utils.decorators import login_required
-from flask_jwt_extended import jwt_required
-from datetime import datetime, timedelta
-from app import db
 from flask_jwt_extended import get_jwt_identity
 from app.models.student import Student
 from app.models.teacher import Teacher
-from app.models.dormitory import DormitoryRoom, DormitoryAssignment
 from app.models.todo import Todo
+from app.utils.stats import get_overview_data, query_student_details
+import json
 stats_bp = Blueprint('stats', __name__)
 
 
 @stats_bp.route('/overview', methods=['GET'])
-@jwt_required()
+@login_required
 def get_overview():
     """获取系统概览数据"""
     try:
@@ -23,87 +21,10 @@ def get_overview():
         current_user = get_jwt_identity()
         user = User.query.get(current_user['user_id'])
 
-        # 获取学生总数和各状态数量
-        total_students = Student.query.count()
-        reported_count = Student.query.filter_by(status='reported').count()
-        unreported_count = Student.query.filter_by(status='unreported').count()
-        pending_count = Student.query.filter_by(status='pending').count()
-
-        # 获取教师总数
-        total_teachers = Teacher.query.count()
-
-        # 获取宿舍统计
-        total_rooms = DormitoryRoom.query.count()
-        occupied_rooms = db.session.query(DormitoryRoom)\
-            .join(DormitoryAssignment)\
-            .filter(DormitoryAssignment.status == 'active')\
-            .distinct().count()
-
-        # 获取专业分布
-        major_stats = db.session.query(
-            Student.major,
-            db.func.count(Student.id).label('count')
-        ).group_by(Student.major).all()
-        
-        major_distribution = [{
-            'major': item[0],
-            'count': item[1]
-        } for item in major_stats]
-
-        # 获取省份分布（包含更多学生信息）
-        province_stats = db.session.query(
-            User.province,
-            Student.major,
-            Student.student_id,
-            User.name,
-            User.gender,
-            Student.status,
-            db.func.count(User.id).label('count')
-        ).join(Student)\
-        .group_by(
-            User.province,
-            Student.major,
-            Student.student_id,
-            User.name,
-            User.gender,
-            Student.status
-        ).all()
-        
-        province_distribution = [{
-            'province': item[0] or '未知',
-            'major': item[1],
-            'studentId': item[2],
-            'name': item[3],
-            'gender': '男' if item[4] == 'M' else '女',
-            'status': {
-                'reported': '已报到',
-                'unreported': '未报到',
-                'pending': '待报到'
-            }.get(item[5], '未知'),
-            'count': item[6]
-        } for item in province_stats]
+        # 全局统计数据走缓存，写操作时失效
+        overview = get_overview_data()
+        stats = dict(overview['stats'])
 
-        # 按省份分组统计
-        province_summary = {}
-        for item in province_distribution:
-            province = item['province']
-            if province not in province_summary:
-                province_summary[province] = 0
-            province_summary[province] += item['count']
-
-        province_stats = [
-            {'province': k, 'count': v}
-            for k, v in province_summary.items()
-        ]
-        # 基础统计数据
-        stats = {
-            'studentCount': User.query.filter_by(role='student').count(),
-            'teacherCount': User.query.filter_by(role='teacher').count(),
-            'classCount': ClassInfo.query.count(),
-            'todayVisits': SystemLog.query.filter(
-                SystemLog.created_at >= datetime.now().date()
-            ).count()
-        }
         # 根据用户角色返回不同的统计信息
         if user.role == 'student':
             student = Student.query.filter_by(user_id=user.id).first()
@@ -134,21 +55,11 @@ def get_overview():
         return jsonify({
             'success': True,
             'data': {
-                'studentStats': {
-                    'total': total_students,
-                    'reported': reported_count,
-                    'unreported': unreported_count,
-                    'pending': pending_count
-                },
-                'teacherCount': total_teachers,
-                'dormitoryStats': {
-                    'total': total_rooms,
-                    'occupied': occupied_rooms,
-                    'available': total_rooms - occupied_rooms
-                },
-                'majorDistribution': major_distribution,
-                'provinceDistribution': province_stats,
-                'studentDetails': province_distribution,
+                'studentStats': overview['studentStats'],
+                'teacherCount': overview['teacherCount'],
+                'dormitoryStats': overview['dormitoryStats'],
+                'majorDistribution': overview['majorDistribution'],
+                'provinceDistribution': overview['provinceDistribution'],
                 'stats': stats
             }
         })
@@ -182,4 +93,47 @@ def get_last_login():
         return jsonify({
             'success': False,
             'message': str(e)
-        }), 500 
\ No newline at end of file
+        }), 500 
+
+@stats_bp.route('/student-details', methods=['GET'])
+@login_required
+def get_student_details():
+    """分页获取学生省份明细，format=ndjson 时以流式返回"""
+    try:
+        cursor = request.args.get('cursor', 0, type=int)
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+
+        if request.args.get('format') == 'ndjson':
+            def generate(after_id):
+                # 按批次游标读取，内存占用与总人数无关
+                while True:
+                    batch = query_student_details(after_id, limit)
+                    for item in batch:
+                        yield json.dumps(item, ensure_ascii=False) + '\n'
+                    if len(batch) < limit:
+                        break
+                    after_id = batch[-1]['id']
+
+            return Response(
+                stream_with_context(generate(cursor)),
+                mimetype='application/x-ndjson'
+            )
+
+        items = query_student_details(cursor, limit + 1)
+        has_more = len(items) > limit
+        items = items[:limit]
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'list': items,
+                'nextCursor': items[-1]['id'] if has_more else None
+            }
+        })
+
+    except Exception as e:
+        print(f"Get student details error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
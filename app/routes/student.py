@@ -10,11 +10,14 @@ from app.utils.analysis import (
     get_gender_admission_ratio,
     get_school_ranking
 )
-from app.models.system_log import SystemLog
+from app.utils.audit import log_operation
 from app.models.user import User
 from datetime import datetime
+import time
 from sqlalchemy import func, case
 from app.models.class_info import ClassInfo
+from app.utils.ranking import get_rank, get_subject_analysis
+from app.utils.stats import invalidate_overview_cache
 
 student_bp = Blueprint('student', __name__)
 
@@ -33,14 +36,12 @@ def get_student_scores():
             }), 404
             
         # 记录查询日志
-        log = SystemLog(
+        log_operation(
             user_id=student_id,
             type='view_scores',
             content='查看个人成绩',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
             
         return jsonify({
             'success': True,
@@ -74,24 +75,14 @@ def get_major_ranking():
                 'message': '未找到成绩记录'
             }), 404
             
-        # 获取同专业的所有成绩
-        major_scores = Score.query.join(Student)\
-            .filter(Student.major == student.major)\
-            .order_by(Score.total_score.desc())\
-            .all()
-            
-        # 计算当前排名
-        current_rank = 1
-        for i, score in enumerate(major_scores, 1):
-            if score.student_id == student.id:
-                current_rank = i
-                break
-                
+        # 从排名索引获取专业排名
+        current_rank, total_students = get_rank(student, by_major=True)
+
         return jsonify({
             'success': True,
             'data': {
                 'currentRank': current_rank,
-                'totalStudents': len(major_scores)
+                'totalStudents': total_students
             }
         })
     except Exception as e:
@@ -112,23 +103,14 @@ def get_school_ranking():
                 'message': '未找到成绩记录'
             }), 404
             
-        # 获取所有成绩并排序
-        all_scores = Score.query\
-            .order_by(Score.total_score.desc())\
-            .all()
-            
-        # 计算当前排名
-        current_rank = 1
-        for i, score in enumerate(all_scores, 1):
-            if score.student_id == student.id:
-                current_rank = i
-                break
-                
+        # 从排名索引获取学校排名
+        current_rank, total_students = get_rank(student)
+
         return jsonify({
             'success': True,
             'data': {
                 'currentRank': current_rank,
-                'totalStudents': len(all_scores)
+                'totalStudents': total_students
             }
         })
     except Exception as e:
@@ -149,45 +131,21 @@ def get_score_analysis():
                 'message': '未找到成绩记录'
             }), 404
             
-        # 计算专业平均分
-        avg_scores = db.session.query(
-            func.avg(Score.chinese).label('chinese'),
-            func.avg(Score.math).label('math'),
-            func.avg(Score.english).label('english'),
-            func.avg(Score.physics).label('physics'),
-            func.avg(Score.chemistry).label('chemistry'),
-            func.avg(Score.biology).label('biology')
-        ).join(Student)\
-        .filter(Student.major == student.major)\
-        .first()
-        
-        # 计算各科目排名
-        subject_ranks = {}
-        for subject in ['chinese', 'math', 'english', 'physics', 'chemistry', 'biology']:
-            scores = Score.query.join(Student)\
-                .filter(Student.major == student.major)\
-                .order_by(getattr(Score, subject).desc())\
-                .all()
-                
-            for i, score in enumerate(scores, 1):
-                if score.student_id == student.id:
-                    subject_ranks[subject] = i
-                    break
-                    
-        return jsonify({
+        # 单次窗口函数查询获取平均分与各科排名
+        started = time.perf_counter()
+        average_scores, subject_ranks = get_subject_analysis(student)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        response = jsonify({
             'success': True,
             'data': {
-                'averageScores': {
-                    'chinese': float(avg_scores.chinese or 0),
-                    'math': float(avg_scores.math or 0),
-                    'english': float(avg_scores.english or 0),
-                    'physics': float(avg_scores.physics or 0),
-                    'chemistry': float(avg_scores.chemistry or 0),
-                    'biology': float(avg_scores.biology or 0)
-                },
+                'averageScores': average_scores,
                 'subjectRanks': subject_ranks
             }
         })
+        # 通过 Server-Timing 暴露查询耗时，便于监控 p99
+        response.headers['Server-Timing'] = f'db;desc="score-analysis";dur={elapsed_ms:.2f}'
+        return response
     except Exception as e:
         return jsonify({
             'success': False,
@@ -292,16 +250,16 @@ def student_report():
         student.status = 'reported'
         student.report_time = datetime.now()
         
+        db.session.commit()
+
         # 记录报到日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='student_report',
             content=f'学生 {user.name} 完成报到',
             ip_address=request.remote_addr
         )
-        
-        db.session.add(log)
-        db.session.commit()
+        invalidate_overview_cache()
         
         return jsonify({
             'success': True,
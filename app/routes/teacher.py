@@ -4,12 +4,12 @@ from app.utils.decorators import teacher_required, login_required
 from app.models.class_info import ClassInfo
 from app.models.student import Student
 from app.models.score import Score
-from app.models.system_log import SystemLog
+from app.utils.audit import log_operation
 from app.models.user import User
 from datetime import datetime
 from app.utils.template import create_student_score_template
 from app.utils.excel import process_student_score_excel
-from app.models.settings import Settings
+from app.utils.options import get_options as get_cached_options, invalidate_options_cache
 from app.schemas import StudentSchema
 from app.models.teacher import Teacher
 from flask_jwt_extended import get_jwt_identity
@@ -21,6 +21,8 @@ from app.utils.analysis import (
 )
 from sqlalchemy import func
 from app.models.analysis_report import AnalysisReport
+from app.utils.ranking import index_scores, remove_from_rank_index
+from app.utils.stats import invalidate_overview_cache
 import json
 from io import BytesIO
 
@@ -120,14 +122,13 @@ def update_class(class_id):
         db.session.commit()
 
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='update_class',
             content=f'更新班级信息：{class_info.class_name}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+        invalidate_options_cache()
         
         return jsonify({
             'success': True,
@@ -238,31 +239,18 @@ def import_scores(class_id):
 @teacher_bp.route('/options', methods=['GET'])
 @login_required
 def get_options():
-    """获取部门和专业选项"""
+    """获取部门和专业选项，支持 If-None-Match 协商缓存"""
     try:
-        # 从系统设置获取选项
-        settings = Settings.query.first()
-        if not settings:
-            return jsonify({
-                'success': False,
-                'message': '系统设置未初始化'
-            }), 500
-            
-        # 获取当前所有班级的年级选项
-        years = db.session.query(ClassInfo.year)\
-            .distinct()\
-            .order_by(ClassInfo.year.desc())\
-            .all()
-        year_options = [year[0] for year in years]
-            
-        return jsonify({
+        options = get_cached_options()
+
+        response = jsonify({
             'success': True,
-            'data': {
-                'departments': settings.departments,  # 院系选项
-                'majors': settings.majors,          # 专业选项
-                'years': year_options
-            }
+            'data': options['data']
         })
+        response.set_etag(options['etag'])
+        # 需登录访问，仅允许浏览器私有缓存且每次向服务器校验
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
     except Exception as e:
 
         return jsonify({
@@ -313,14 +301,14 @@ def create_class():
         db.session.commit()
         
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='create_class',
             content=f'创建班级：{class_name}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit() 
+        invalidate_overview_cache()
+        invalidate_options_cache()
         
         return jsonify({
             'success': True,
@@ -348,6 +336,8 @@ def delete_class(class_id):
         
         db.session.delete(class_info)
         db.session.commit() 
+        invalidate_overview_cache()
+        invalidate_options_cache()
         
         return jsonify({
             'success': True,
@@ -431,15 +421,15 @@ def assign_students(class_id):
         # 更新班级已分配学生数量
         class_obj.assigned_students = current_student_count + len(students)
         
+        db.session.commit()
+
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='assign_students',
             content=f'分配学生到班级：{class_id}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
         
         return jsonify({
             'success': True,
@@ -489,14 +479,12 @@ def remove_students(class_id):
         db.session.commit()
         
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='remove_students',
             content=f'从班级移除学生：{class_id}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
         return jsonify({
             'success': True,
             'message': '移除成功'
@@ -550,14 +538,22 @@ def update_class_scores(class_id):
         ).first_or_404()
         
         # 批量更新成绩
+        updated_scores = []
         for score_data in scores:
             score = Score.query.get(score_data['id'])
             if score:
                 for key, value in score_data.items():
                     if key != 'id':
                         setattr(score, key, value)
+                updated_scores.append(score)
                         
         db.session.commit()
+
+        # 同步排名索引
+        index_scores(
+            (score.student_id, score.student.major, score.total_score)
+            for score in updated_scores
+        )
         
         return jsonify({
             'success': True,
@@ -607,15 +603,18 @@ def update_score(score_id):
             score.biology
         )
         
+        db.session.commit()
+
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='update_score',
             content=f'更新学生成绩：{student.user.name}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
+
+        # 同步排名索引
+        index_scores([(student.id, student.major, score.total_score)])
         
         return jsonify({
             'success': True,
@@ -645,18 +644,20 @@ def delete_score(score_id):
                 'message': '无权删除该学生成绩'
             }), 403
             
+        # 删除成绩
+        db.session.delete(score)
+        db.session.commit()
+
         # 记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='delete_score',
             content=f'删除学生成绩：{student.user.name}',
             ip_address=request.remote_addr
         )
-        
-        # 删除成绩
-        db.session.delete(score)
-        db.session.add(log)
-        db.session.commit()
+
+        # 同步排名索引
+        remove_from_rank_index(student.id, student.major)
         
         return jsonify({
             'success': True,
@@ -748,15 +749,14 @@ def analyze_class_scores(class_id):
                 report_data=report_content
             )
             db.session.add(new_report)
+        db.session.commit()
         #记录日志
-        log = SystemLog(
+        log_operation(
             user_id=g.user_id,
             type='generate_analysis_report',
             content=f'生成班级成绩分析报告：{class_id}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
 
         return jsonify({
             'success': True,
@@ -901,15 +901,15 @@ def update_student_report_status(student_id):
             student.report_time = datetime.now()
         else:
             student.report_time = None
+        db.session.commit()
         #记录日志
-        log = SystemLog(
+        log_operation(
             user_id=user.id,
             type='update_student_report_status',
             content=f'{user.name}更新学生报到状态：{student.user.name}',
             ip_address=request.remote_addr
-        )   
-        db.session.add(log)
-        db.session.commit()
+        )
+        invalidate_overview_cache()
 
         return jsonify({
             'success': True,
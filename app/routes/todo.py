@@ -6,7 +6,7 @@ from datetime import datetime
 from app.models import Student, ClassInfo, Teacher
 from app.models.user import User
 from flask_jwt_extended import get_jwt_identity
-from app.models.system_log import SystemLog
+from app.utils.audit import log_operation
 todo_bp = Blueprint('todo', __name__)
 
 @todo_bp.route('/todos', methods=['GET'])
@@ -124,15 +124,14 @@ def create_todo():
         )
         
         db.session.add(todo)
+        db.session.commit()
         #记录日志
-        log = SystemLog(
+        log_operation(
             user_id=user.id,
             type='create_todo',
             content=f'{user.name}创建待办事项：{todo.title}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
         
         return jsonify({
             'success': True,
@@ -182,15 +181,14 @@ def update_todo(todo_id):
             if todo.status == 'pending':  # 只能在待处理状态下修改
                 todo.title = data.get('title', todo.title)
                 todo.content = data.get('content', todo.content)
+        db.session.commit()
         #记录日志   
-        log = SystemLog(
+        log_operation(
             user_id=user.id,
             type='update_todo',
             content=f'{user.name}更新待办事项：{todo.title}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
         return jsonify({
             'success': True,
             'data': todo.to_dict()
@@ -228,13 +226,14 @@ def delete_todo(todo_id):
                     'message': '无权删除此待办事项'
                 }), 403
         
+        log_content = f'{user.name}删除待办事项：{todo.title}'
         db.session.delete(todo)
         db.session.commit()
         #记录日志
-        log = SystemLog(
+        log_operation(
             user_id=user.id,
             type='delete_todo',
-            content=f'{user.name}删除待办事项：{todo.title}',
+            content=log_content,
             ip_address=request.remote_addr
         )
         return jsonify({
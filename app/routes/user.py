@@ -1,13 +1,15 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import User, Student, SystemLog
+from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
+from app.models import User, Student
+from app.utils.audit import log_operation
+from app.utils.decorators import login_required
 from app import db
 from werkzeug.security import check_password_hash
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/profile', methods=['GET'])
-@jwt_required()
+@login_required
 def get_profile():
     """获取用户信息"""
     try:
@@ -34,7 +36,7 @@ def get_profile():
         }), 500
 
 @user_bp.route('/profile', methods=['PUT'])
-@jwt_required()
+@login_required
 def update_profile():
     """更新用户信息"""
     try:
@@ -66,14 +68,13 @@ def update_profile():
         
         # 记录操作日志
         if changed_fields:
-            log = SystemLog(
+            db.session.commit()
+            log_operation(
                 user_id=user.id,
                 type='update_profile',
                 content=f'更新个人信息: {", ".join(changed_fields)}',
                 ip_address=request.remote_addr
             )
-            db.session.add(log)
-            db.session.commit()
             
         return jsonify({"success": True, "message": "Profile updated successfully"}), 200
         
@@ -85,7 +86,10 @@ def update_profile():
 @user_bp.route('/password', methods=['PUT'])
 @jwt_required()
 def update_password():
-    """更新密码"""
+    """更新密码
+
+    需要修改初始密码的账号也可调用，修改成功后返回不带限制的新访问令牌
+    """
     try:
         current_user = get_jwt_identity()
         user = User.query.get(current_user['user_id'])
@@ -103,17 +107,21 @@ def update_password():
             
         user.set_password(data['new_password'])
         
+        db.session.commit()
+
         # 记录密码修改日志
-        log = SystemLog(
+        log_operation(
             user_id=user.id,
             type='update_password',
             content='修改密码',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
-        db.session.commit()
         
-        return jsonify({"success": True, "message": "Password updated successfully"}), 200
+        return jsonify({
+            "success": True,
+            "message": "Password updated successfully",
+            "access_token": create_access_token(identity=current_user)
+        }), 200
         
     except Exception as e:
         db.session.rollback()
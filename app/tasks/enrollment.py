@@ -1,45 +1,161 @@
-from app.extensions import db
+from app.extensions import db, redis_client, scheduler
 from app.models.student import Student
 from app.models.settings import Settings
-from app.models.system_log import SystemLog
+from app.utils.audit import log_operation
+from app.utils.leader import leader_only
+from app.utils.stats import invalidate_overview_cache
 from datetime import datetime
-from sqlalchemy import and_
-from flask import current_app
+from sqlalchemy import update
+from redis.exceptions import RedisError
 
-def check_enrollment_deadline():
-    """检查报到截止时间，更新未报到学生状态"""
+ENROLLMENT_DEADLINE_KEY = 'enrollment:deadline'  # 缓存的报到截止时间，未设置时为空串
+ENROLLMENT_SWEEP_KEY = 'enrollment:swept'  # 已完成处理的 截止时间|入学年份
+ENROLLMENT_DEADLINE_TTL = 3600
+ENROLLMENT_JOB_ID = 'enrollment_deadline'
+
+_UNSET = object()
+_scheduled_deadline = _UNSET  # 本进程已注册一次性任务对应的截止时间
+
+
+def _get_deadline():
+    """读取报到截止时间，优先使用缓存，截止时间变更时由设置更新清除"""
+    try:
+        cached = redis_client.get(ENROLLMENT_DEADLINE_KEY)
+        if cached is not None:
+            return datetime.fromisoformat(cached) if cached else None
+    except RedisError as e:
+        print(f"Get enrollment deadline cache error: {str(e)}")
+
+    deadline = db.session.query(Settings.enrollment_deadline).limit(1).scalar()
+    try:
+        redis_client.setex(
+            ENROLLMENT_DEADLINE_KEY,
+            ENROLLMENT_DEADLINE_TTL,
+            deadline.isoformat() if deadline else ''
+        )
+    except RedisError as e:
+        print(f"Set enrollment deadline cache error: {str(e)}")
+    return deadline
+
+
+def reset_enrollment_sweep():
+    """新增或变更待报到学生后清除已处理标记，下次任务重新检查"""
+    try:
+        redis_client.delete(ENROLLMENT_SWEEP_KEY)
+    except RedisError as e:
+        print(f"Reset enrollment sweep error: {str(e)}")
+
+
+def invalidate_enrollment_deadline():
+    """报到截止时间变更后清除缓存和已处理标记"""
+    try:
+        redis_client.delete(ENROLLMENT_DEADLINE_KEY, ENROLLMENT_SWEEP_KEY)
+    except RedisError as e:
+        print(f"Invalidate enrollment deadline error: {str(e)}")
+
+
+def _sweep_done(marker):
     try:
-        settings = Settings.query.first()
-        if not settings or not settings.enrollment_deadline:
+        return redis_client.get(ENROLLMENT_SWEEP_KEY) == marker
+    except RedisError as e:
+        print(f"Get enrollment sweep marker error: {str(e)}")
+        return False
+
+
+def sweep_enrollment_deadline():
+    """检查报到截止时间，更新未报到学生状态
+
+    只更新 status = 'pending' 的学生并写入已处理标记，多个进程同时执行也不会重复处理
+    """
+    try:
+        deadline = _get_deadline()
+        if not deadline:
             return
-            
+
         now = datetime.now()
-        if now >= settings.enrollment_deadline:
-            # 查找所有待报到的学生
-            pending_students = Student.query.filter(
-                and_(
-                    Student.status == 'pending',
-                    Student.admission_year == now.year  # 只处理当年的新生
-                )
-            ).all()
-            
-            # 更新状态
-            updated_count = 0
-            for student in pending_students:
-                student.status = 'unreported'
-                updated_count += 1
-            
-            if updated_count > 0:
-                # 记录系统日志
-                log = SystemLog(
-                    user_id=None,  # 系统自动操作
-                    type='system_auto',
-                    content=f'系统自动更新{updated_count}名未报到学生状态',
-                    ip_address='127.0.0.1'
-                )
-                db.session.add(log)
-                db.session.commit()
-                
+        if now < deadline:
+            return
+
+        # 同一截止时间、同一届新生只需处理一次
+        marker = f'{deadline.isoformat()}|{now.year}'
+        if _sweep_done(marker):
+            return
+
+        # 先写标记再更新：更新期间新增的待报到学生会清除标记，下次任务再处理
+        try:
+            redis_client.set(ENROLLMENT_SWEEP_KEY, marker)
+        except RedisError as e:
+            print(f"Set enrollment sweep marker error: {str(e)}")
+
+        result = db.session.execute(
+            update(Student)
+            .where(
+                Student.status == 'pending',
+                Student.admission_year == now.year  # 只处理当年的新生
+            )
+            .values(status='unreported')
+            .execution_options(synchronize_session=False)
+        )
+        updated_count = result.rowcount
+        db.session.commit()
+
+        if updated_count > 0:
+            # 记录系统日志
+            log_operation(
+                user_id=None,  # 系统自动操作
+                type='system_auto',
+                content=f'系统自动更新{updated_count}名未报到学生状态',
+                ip_address='127.0.0.1'
+            )
+            invalidate_overview_cache()
+
     except Exception as e:
         print(f"Check enrollment deadline error: {str(e)}")
-        db.session.rollback() 
\ No newline at end of file
+        db.session.rollback()
+        reset_enrollment_sweep()
+
+
+@leader_only
+def check_enrollment_deadline():
+    """定期补处理：仅由领导者进程执行"""
+    sweep_enrollment_deadline()
+
+
+def _run_deadline_job(app):
+    # 截止时刻的一次性任务不经过领导者选举：修改设置的进程未必是领导者，
+    # 由它按时执行；其余进程的同一任务因已处理标记或已无待报到学生而为空操作
+    with app.app_context():
+        sweep_enrollment_deadline()
+
+
+def schedule_enrollment_deadline(app, deadline):
+    """在报到截止时间注册一次性任务，截止时间变更时替换原任务"""
+    global _scheduled_deadline
+    if scheduler.get_job(ENROLLMENT_JOB_ID):
+        scheduler.remove_job(ENROLLMENT_JOB_ID)
+    if deadline:
+        scheduler.add_job(
+            id=ENROLLMENT_JOB_ID,
+            func=_run_deadline_job,
+            args=[app],
+            trigger='date',
+            run_date=max(deadline, datetime.now()),
+            misfire_grace_time=None  # 错过执行时间（如进程重启）后仍补执行
+        )
+    _scheduled_deadline = deadline
+
+
+def sync_enrollment_deadline(app):
+    """按缓存的截止时间校正本进程的一次性任务
+
+    其他进程修改设置后在此同步；截止后新增的待报到学生由已处理标记触发补处理
+    """
+    try:
+        deadline = _get_deadline()
+        if deadline != _scheduled_deadline:
+            schedule_enrollment_deadline(app, deadline)
+        elif deadline and datetime.now() >= deadline:
+            check_enrollment_deadline()
+    except Exception as e:
+        print(f"Sync enrollment deadline error: {str(e)}")
+        db.session.rollback()
@@ -0,0 +1,116 @@
+from app.extensions import db, redis_client
+from app.utils.audit import log_operation
+from app.utils.excel import process_student_excel, process_teacher_excel
+from app.utils.stats import invalidate_overview_cache
+from app.tasks.enrollment import reset_enrollment_sweep
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import json
+import uuid
+
+IMPORT_JOB_KEY = 'import_job:{}'
+IMPORT_JOB_TTL = 24 * 3600  # 任务状态保留一天
+
+# 导入任务类型 -> (处理函数, 日志类型, 日志描述)
+IMPORT_PROCESSORS = {
+    'students': (process_student_excel, 'import_students', '导入学生'),
+    'teachers': (process_teacher_excel, 'import_teachers', '批量导入教师'),
+}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='import-job')
+
+
+def _save_job(job_id, **fields):
+    """更新任务状态"""
+    if 'errors' in fields:
+        fields['errors'] = json.dumps(fields['errors'], ensure_ascii=False)
+    key = IMPORT_JOB_KEY.format(job_id)
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping=fields)
+    pipe.expire(key, IMPORT_JOB_TTL)
+    pipe.execute()
+
+
+def get_import_job(job_id):
+    """获取导入任务状态，不存在时返回 None"""
+    job = redis_client.hgetall(IMPORT_JOB_KEY.format(job_id))
+    if not job:
+        return None
+    return {
+        'jobId': job_id,
+        'type': job.get('type'),
+        'status': job.get('status'),
+        'total': int(job.get('total', 0)),
+        'processed': int(job.get('processed', 0)),
+        'success': int(job.get('success', 0)),
+        'failed': int(job.get('failed', 0)),
+        'errors': json.loads(job.get('errors', '[]')),
+        'message': job.get('message')
+    }
+
+
+def submit_import_job(app, import_type, file_data, user_id, ip_address):
+    """提交后台导入任务，立即返回任务ID"""
+    job_id = uuid.uuid4().hex
+    _save_job(
+        job_id,
+        type=import_type,
+        status='pending',
+        total=0,
+        processed=0,
+        success=0,
+        failed=0,
+        errors=[],
+        message=''
+    )
+    _executor.submit(_run_import_job, app, job_id, import_type, file_data, user_id, ip_address)
+    return job_id
+
+
+def _run_import_job(app, job_id, import_type, file_data, user_id, ip_address):
+    """在工作线程中执行导入"""
+    processor, log_type, log_label = IMPORT_PROCESSORS[import_type]
+    with app.app_context():
+        try:
+            _save_job(job_id, status='running')
+
+            def progress(total, processed, success, failed, errors):
+                _save_job(
+                    job_id,
+                    total=total,
+                    processed=processed,
+                    success=success,
+                    failed=failed,
+                    errors=errors
+                )
+
+            result = processor(BytesIO(file_data), progress=progress)
+
+            db.session.commit()
+
+            # 记录操作日志
+            log_operation(
+                user_id=user_id,
+                type=log_type,
+                content=f'{log_label}: 成功{result["success"]}条，失败{result["failed"]}条',
+                ip_address=ip_address
+            )
+            invalidate_overview_cache()
+            if import_type == 'students':
+                reset_enrollment_sweep()
+
+            _save_job(
+                job_id,
+                status='finished',
+                total=result['total'],
+                processed=result['total'],
+                success=result['success'],
+                failed=result['failed'],
+                errors=result['errors']
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"Import job {job_id} error: {str(e)}")
+            _save_job(job_id, status='failed', message=str(e))
+        finally:
+            db.session.remove()
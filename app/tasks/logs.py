@@ -0,0 +1,61 @@
+from app.extensions import db
+from app.models.system_log import SystemLog, SystemLogArchive
+from app.utils.audit import log_operation
+from app.utils.leader import leader_only
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, delete
+from flask import current_app
+
+ARCHIVE_COLUMNS = ('id', 'user_id', 'type', 'content', 'ip_address', 'created_at')
+
+
+@leader_only
+def archive_old_logs():
+    """将超过保留期限的操作日志按批次移入归档表，并清理过期归档"""
+    try:
+        config = current_app.config
+        batch_size = config['LOG_ARCHIVE_BATCH_SIZE']
+        cutoff = datetime.now() - timedelta(days=config['LOG_RETENTION_DAYS'])
+        log_table = SystemLog.__table__
+        archive_table = SystemLogArchive.__table__
+
+        archived = 0
+        while True:
+            # 按主键取一批，归档与删除在同一事务内完成
+            ids = db.session.execute(
+                select(log_table.c.id)
+                .where(log_table.c.created_at < cutoff)
+                .order_by(log_table.c.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+
+            db.session.execute(
+                insert(archive_table).from_select(
+                    ARCHIVE_COLUMNS,
+                    select(*[log_table.c[name] for name in ARCHIVE_COLUMNS]).where(log_table.c.id.in_(ids))
+                )
+            )
+            db.session.execute(delete(log_table).where(log_table.c.id.in_(ids)))
+            db.session.commit()
+            archived += len(ids)
+
+        purged = 0
+        if config['LOG_ARCHIVE_RETENTION_DAYS'] > 0:
+            archive_cutoff = datetime.now() - timedelta(days=config['LOG_ARCHIVE_RETENTION_DAYS'])
+            result = db.session.execute(delete(archive_table).where(archive_table.c.created_at < archive_cutoff))
+            purged = result.rowcount
+            db.session.commit()
+
+        if archived or purged:
+            log_operation(
+                user_id=None,  # 系统自动操作
+                type='system_auto',
+                content=f'系统自动归档{archived}条操作日志，清理{purged}条过期归档',
+                ip_address='127.0.0.1'
+            )
+
+    except Exception as e:
+        print(f"Archive system logs error: {str(e)}")
+        db.session.rollback()
@@ -0,0 +1,138 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert
+from app.extensions import db
+from app.models.system_log import SystemLog
+
+# 操作日志先写入进程内有界队列，由后台线程批量插入 system_logs
+_app = None
+_queue = None
+_worker = None
+_worker_pid = None
+_flush_lock = threading.Lock()
+_start_lock = threading.Lock()
+_stopping = threading.Event()
+WRITE_RETRY_DELAY = 0.5  # 重试间隔基数（秒），按次数递增
+
+
+def init_audit(app):
+    """绑定应用并注册退出时的刷新"""
+    global _app, _queue
+    _app = app
+    _queue = queue.Queue(maxsize=app.config['AUDIT_QUEUE_SIZE'])
+    atexit.register(shutdown_audit)
+
+
+def _ensure_worker():
+    """按需启动后台写入线程，fork 出的子进程会重新启动自己的线程"""
+    global _worker, _worker_pid
+    if _worker is not None and _worker.is_alive() and _worker_pid == os.getpid():
+        return
+    with _start_lock:
+        if _worker is not None and _worker.is_alive() and _worker_pid == os.getpid():
+            return
+        _worker = threading.Thread(target=_run_worker, name='audit-log-writer', daemon=True)
+        _worker_pid = os.getpid()
+        _worker.start()
+
+
+def log_operation(type, content, user_id=None, ip_address=None, sync=False):
+    """记录操作日志，实际写入由后台线程批量完成
+
+    应在业务事务提交后调用；队列已满时由当前线程先刷新一批再入队。
+    sync=True 时立即写入，用于登录等写入后马上会被查询的日志
+    """
+    event = {
+        'user_id': user_id,
+        'type': type,
+        'content': content,
+        'ip_address': ip_address,
+        'created_at': datetime.now()
+    }
+    if sync or _app is None or _stopping.is_set():
+        # 未初始化（如离线脚本）或进程正在退出时直接同步写入
+        _write_batch([event])
+        return
+
+    _ensure_worker()
+    try:
+        _queue.put_nowait(event)
+    except queue.Full:
+        flush_audit_logs()
+        _queue.put(event)
+
+
+def _drain(limit):
+    batch = []
+    while len(batch) < limit:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _insert(rows):
+    with db.engine.begin() as connection:
+        connection.execute(insert(SystemLog.__table__), rows)
+
+
+def _write_batch(batch):
+    """多行插入一批日志
+
+    失败时按 AUDIT_WRITE_RETRIES 次数退避重试；仍失败则逐条插入，
+    避免个别异常数据连累整批，最终写不进去的日志打印到标准输出留底
+    """
+    retries = current_app.config.get('AUDIT_WRITE_RETRIES', 3)
+    for attempt in range(retries + 1):
+        try:
+            _insert(batch)
+            return
+        except Exception as e:
+            print(f"Audit log write error (attempt {attempt + 1}): {str(e)}")
+            if attempt < retries:
+                time.sleep(WRITE_RETRY_DELAY * (attempt + 1))
+
+    for event in batch:
+        try:
+            _insert([event])
+        except Exception as e:
+            print(f"Audit log dropped: {event!r}, error: {str(e)}")
+
+
+def flush_audit_logs():
+    """立即写入队列中的全部日志"""
+    if _queue is None:
+        return
+    batch_size = _app.config['AUDIT_BATCH_SIZE']
+    with _flush_lock, _app.app_context():
+        while True:
+            batch = _drain(batch_size)
+            if not batch:
+                break
+            _write_batch(batch)
+
+
+def _run_worker():
+    interval = _app.config['AUDIT_FLUSH_INTERVAL']
+    batch_size = _app.config['AUDIT_BATCH_SIZE']
+    while not _stopping.is_set():
+        try:
+            first = _queue.get(timeout=interval)
+        except queue.Empty:
+            continue
+        with _flush_lock, _app.app_context():
+            _write_batch([first] + _drain(batch_size - 1))
+
+
+def shutdown_audit():
+    """进程退出前停止后台线程并写入剩余日志"""
+    _stopping.set()
+    if _worker is not None and _worker_pid == os.getpid():
+        _worker.join(timeout=_app.config['AUDIT_FLUSH_INTERVAL'] + 5)
+    flush_audit_logs()
@@ -0,0 +1,32 @@
+import json
+from app.extensions import redis_client
+from redis.exceptions import RedisError
+
+
+def get_cached(key, builder, ttl=60):
+    """读取JSON缓存，未命中时调用 builder 生成并写入
+
+    Redis 不可用时直接返回 builder 的结果
+    """
+    try:
+        cached = redis_client.get(key)
+        if cached is not None:
+            return json.loads(cached)
+    except RedisError as e:
+        print(f"Cache read error: {str(e)}")
+        return builder()
+
+    value = builder()
+    try:
+        redis_client.setex(key, ttl, json.dumps(value, ensure_ascii=False))
+    except RedisError as e:
+        print(f"Cache write error: {str(e)}")
+    return value
+
+
+def invalidate(*keys):
+    """删除缓存键"""
+    try:
+        redis_client.delete(*keys)
+    except RedisError as e:
+        print(f"Cache invalidate error: {str(e)}")
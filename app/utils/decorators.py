@@ -1,12 +1,28 @@
 from functools import wraps
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
 from flask import jsonify, g
 
+# 批量导入等使用初始密码的账号，登录后访问令牌带有该声明，修改密码前只能调用修改密码接口
+PASSWORD_CHANGE_CLAIM = 'must_change_password'
+
+def password_change_pending():
+    """当前令牌要求先修改初始密码时返回 403 响应，否则返回 None"""
+    if get_jwt().get(PASSWORD_CHANGE_CLAIM):
+        return jsonify({
+            'success': False,
+            'message': '请先修改初始密码',
+            'mustChangePassword': True
+        }), 403
+    return None
+
 def role_required(roles):
     def wrapper(fn):
         @wraps(fn)
         def decorator(*args, **kwargs):
             verify_jwt_in_request()
+            pending = password_change_pending()
+            if pending:
+                return pending
             current_user = get_jwt_identity()
             if current_user['role'] not in roles:
                 return jsonify({"msg": "Unauthorized access"}), 403
@@ -20,6 +36,9 @@ def student_required(f):
     def decorated_function(*args, **kwargs):
         try:
             verify_jwt_in_request()
+            pending = password_change_pending()
+            if pending:
+                return pending
             current_user = get_jwt_identity()
             
             if not current_user or 'user_id' not in current_user:
@@ -53,6 +72,9 @@ def teacher_required(f):
     def decorated_function(*args, **kwargs):
         try:
             verify_jwt_in_request()
+            pending = password_change_pending()
+            if pending:
+                return pending
             current_user = get_jwt_identity()
             
             if not current_user or 'user_id' not in current_user:
@@ -86,6 +108,9 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         try:
             verify_jwt_in_request()
+            pending = password_change_pending()
+            if pending:
+                return pending
             current_user = get_jwt_identity()
             
             if not current_user or 'user_id' not in current_user:
@@ -120,6 +145,9 @@ def teacher_or_admin_required(f):
     def decorated_function(*args, **kwargs):
         try:
             verify_jwt_in_request()
+            pending = password_change_pending()
+            if pending:
+                return pending
             current_user = get_jwt_identity()
             
             if not current_user or 'user_id' not in current_user:
@@ -153,6 +181,9 @@ def login_required(f):
     def decorated_function(*args, **kwargs):
         try:
             verify_jwt_in_request()
+            pending = password_change_pending()
+            if pending:
+                return pending
             current_user = get_jwt_identity()
             
             if not current_user or 'user_id' not in current_user:
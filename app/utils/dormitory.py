@@ -0,0 +1,410 @@
+from app.extensions import db, redis_client
+from app.models.dormitory import DormitoryBuilding, DormitoryRoom, DormitoryAssignment
+from app.models.student import Student
+from app.models.user import User
+from app.utils.cache import get_cached, invalidate
+from app.utils.stats import OVERVIEW_CACHE_KEY
+from datetime import datetime
+from sqlalchemy import update, case, insert, bindparam
+
+BUILDING_SUMMARY_CACHE_KEY = 'stats:dormitory_buildings'
+BUILDING_SUMMARY_TTL = 3600  # 兜底过期时间，正常由宿舍写操作主动清除
+
+
+def reserve_beds(room_id, count=1):
+    """原子地占用房间床位
+
+    使用条件更新 current_occupancy + count <= capacity，并发分配时不会超员；
+    剩余床位不足时返回 False
+    """
+    result = db.session.execute(
+        update(DormitoryRoom)
+        .where(
+            DormitoryRoom.id == room_id,
+            DormitoryRoom.current_occupancy + count <= DormitoryRoom.capacity
+        )
+        .values(current_occupancy=DormitoryRoom.current_occupancy + count)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_beds(room_id, count=1):
+    """释放房间床位，入住人数不会减到负数"""
+    db.session.execute(
+        update(DormitoryRoom)
+        .where(DormitoryRoom.id == room_id)
+        .values(current_occupancy=case(
+            (DormitoryRoom.current_occupancy > count, DormitoryRoom.current_occupancy - count),
+            else_=0
+        ))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def end_assignment(assignment_id):
+    """将在住分配记录置为已退宿
+
+    使用条件更新 status = 'active'，并发退宿或调宿同一记录时只有一个请求成功；
+    记录已退宿时返回 False，调用方仅在成功后释放床位
+    """
+    now = datetime.now()
+    result = db.session.execute(
+        update(DormitoryAssignment)
+        .where(
+            DormitoryAssignment.id == assignment_id,
+            DormitoryAssignment.status == 'active'
+        )
+        .values(status='inactive', check_out_date=now, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _active_assignment_counts(building_id):
+    """一次分组查询统计宿舍楼内各房间的在住分配记录数"""
+    rows = db.session.query(
+        DormitoryAssignment.room_id,
+        db.func.count(DormitoryAssignment.id)
+    ).join(DormitoryRoom, DormitoryAssignment.room_id == DormitoryRoom.id)\
+        .filter(
+            DormitoryRoom.building_id == building_id,
+            DormitoryAssignment.status == 'active'
+        ).group_by(DormitoryAssignment.room_id).all()
+    return dict(rows)
+
+
+def recount_room_occupancy(building_id):
+    """根据在住分配记录重新校准宿舍楼内各房间的入住人数"""
+    occupancy = _active_assignment_counts(building_id)
+    rooms = DormitoryRoom.query.filter_by(building_id=building_id).all()
+    for room in rooms:
+        room.current_occupancy = occupancy.get(room.id, 0)
+    db.session.commit()
+
+
+def build_building_summary():
+    """按宿舍楼汇总房间数、床位数、入住人数、满员房间数及各楼层空床位"""
+    remaining = DormitoryRoom.capacity - DormitoryRoom.current_occupancy
+    building_rows = db.session.query(
+        DormitoryBuilding.id,
+        DormitoryBuilding.name,
+        DormitoryBuilding.gender,
+        db.func.count(DormitoryRoom.id).label('rooms'),
+        db.func.coalesce(db.func.sum(DormitoryRoom.capacity), 0).label('beds'),
+        db.func.coalesce(db.func.sum(DormitoryRoom.current_occupancy), 0).label('occupied'),
+        db.func.coalesce(db.func.sum(case((remaining <= 0, 1), else_=0)), 0).label('full_rooms')
+    ).outerjoin(DormitoryRoom, DormitoryRoom.building_id == DormitoryBuilding.id)\
+        .group_by(DormitoryBuilding.id, DormitoryBuilding.name, DormitoryBuilding.gender)\
+        .order_by(DormitoryBuilding.id)\
+        .all()
+
+    # 房间号去掉末两位即为楼层，如 305 -> 3
+    floor = db.func.substr(DormitoryRoom.room_number, 1, db.func.length(DormitoryRoom.room_number) - 2)
+    floor_rows = db.session.query(
+        DormitoryRoom.building_id,
+        floor.label('floor'),
+        db.func.count(DormitoryRoom.id).label('rooms'),
+        db.func.sum(case((remaining > 0, remaining), else_=0)).label('vacancy')
+    ).group_by(DormitoryRoom.building_id, floor)\
+        .order_by(DormitoryRoom.building_id, floor)\
+        .all()
+
+    floors = {}
+    for row in floor_rows:
+        floors.setdefault(row.building_id, []).append({
+            'floor': row.floor or '',
+            'rooms': row.rooms,
+            'vacancy': int(row.vacancy or 0)
+        })
+
+    return [{
+        'id': row.id,
+        'name': row.name,
+        'gender': row.gender,
+        'roomCount': row.rooms,
+        'beds': int(row.beds),
+        'occupied': int(row.occupied),
+        'vacancy': max(int(row.beds) - int(row.occupied), 0),
+        'fullRooms': int(row.full_rooms),
+        'floors': floors.get(row.id, [])
+    } for row in building_rows]
+
+
+def get_building_summary():
+    """获取缓存的宿舍楼汇总数据"""
+    return get_cached(BUILDING_SUMMARY_CACHE_KEY, build_building_summary, ttl=BUILDING_SUMMARY_TTL)
+
+
+def invalidate_dormitory_cache():
+    """宿舍楼、房间或分配变更后清除宿舍汇总及系统概览缓存"""
+    invalidate(BUILDING_SUMMARY_CACHE_KEY, OVERVIEW_CACHE_KEY)
+
+
+ALLOCATION_CHUNK_SIZE = 500
+ALLOCATION_LOCK_KEY = 'dorm:allocation:lock'
+ALLOCATION_LOCK_TIMEOUT = 300  # 锁自动过期秒数，防止进程异常退出后无法释放
+ALLOCATION_LOCK_WAIT = 30  # 等待其他分配完成的最长秒数
+ALLOCATION_GROUP_KEYS = {
+    'major': lambda student: student.major or '',
+    'class': lambda student: student.class_id or 0,
+}
+
+
+def allocation_lock():
+    """自动分配的全局锁，等待超时抛出 LockError"""
+    return redis_client.lock(
+        ALLOCATION_LOCK_KEY,
+        timeout=ALLOCATION_LOCK_TIMEOUT,
+        blocking_timeout=ALLOCATION_LOCK_WAIT
+    )
+
+
+def allocate_rooms(building_id=None, group_by=None):
+    """批量为已报到且未分配宿舍的学生自动分配房间
+
+    按性别匹配宿舍楼，可按专业或班级分组使同组学生住在相邻房间；
+    候选房间加行锁后在内存中按顺序装填，分配记录一次性批量插入。
+    待分配学生未加锁，调用方需在 allocation_lock() 内调用并提交事务，
+    避免宿舍楼不同的两次分配读到同一批学生
+    """
+    has_room = db.session.query(DormitoryAssignment.id).filter(
+        DormitoryAssignment.student_id == Student.id,
+        DormitoryAssignment.status == 'active'
+    ).exists()
+    students = db.session.query(
+        Student.id,
+        Student.major,
+        Student.class_id,
+        User.gender
+    ).join(User, Student.user_id == User.id)\
+        .filter(
+            Student.status == 'reported',
+            User.gender.isnot(None),
+            ~has_room
+        ).order_by(Student.id).all()
+
+    room_query = db.session.query(
+        DormitoryRoom.id,
+        DormitoryRoom.capacity,
+        DormitoryRoom.current_occupancy,
+        DormitoryBuilding.gender
+    ).join(DormitoryBuilding, DormitoryRoom.building_id == DormitoryBuilding.id)\
+        .filter(DormitoryRoom.current_occupancy < DormitoryRoom.capacity)
+    if building_id:
+        room_query = room_query.filter(DormitoryRoom.building_id == building_id)
+    rooms = room_query.order_by(DormitoryRoom.building_id, DormitoryRoom.room_number)\
+        .with_for_update()\
+        .all()
+
+    # 各性别可用房间及剩余床位
+    free_rooms = {}
+    for room in rooms:
+        free_rooms.setdefault(room.gender, []).append([room.id, room.capacity - room.current_occupancy])
+
+    # 各性别学生分组，大组优先装填
+    group_key = ALLOCATION_GROUP_KEYS.get(group_by, lambda student: None)
+    groups = {}
+    for student in students:
+        groups.setdefault(student.gender, {}).setdefault(group_key(student), []).append(student.id)
+
+    now = datetime.now()
+    assignments = []
+    room_counts = {}
+    unassigned = 0
+    for gender, gender_groups in groups.items():
+        available = free_rooms.get(gender, [])
+        position = 0
+        for members in sorted(gender_groups.values(), key=len, reverse=True):
+            for student_id in members:
+                while position < len(available) and available[position][1] == 0:
+                    position += 1
+                if position == len(available):
+                    unassigned += 1
+                    continue
+                room_id = available[position][0]
+                available[position][1] -= 1
+                room_counts[room_id] = room_counts.get(room_id, 0) + 1
+                assignments.append({
+                    'student_id': student_id,
+                    'room_id': room_id,
+                    'check_in_date': now,
+                    'status': 'active',
+                    'created_at': now,
+                    'updated_at': now
+                })
+
+    for i in range(0, len(assignments), ALLOCATION_CHUNK_SIZE):
+        db.session.execute(insert(DormitoryAssignment), assignments[i:i + ALLOCATION_CHUNK_SIZE])
+    if room_counts:
+        rooms_table = DormitoryRoom.__table__
+        db.session.execute(
+            update(rooms_table)
+            .where(rooms_table.c.id == bindparam('b_room_id'))
+            .values(current_occupancy=rooms_table.c.current_occupancy + bindparam('b_count')),
+            [{'b_room_id': room_id, 'b_count': count} for room_id, count in room_counts.items()]
+        )
+
+    return {
+        'assigned': len(assignments),
+        'unassigned': unassigned,
+        'rooms': len(room_counts)
+    }
+
+
+def _apply_occupancy_deltas(deltas):
+    """按房间批量调整入住人数，deltas 为 房间ID -> 变化量"""
+    deltas = {room_id: delta for room_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rooms_table = DormitoryRoom.__table__
+    new_occupancy = rooms_table.c.current_occupancy + bindparam('b_delta')
+    db.session.execute(
+        update(rooms_table)
+        .where(rooms_table.c.id == bindparam('b_room_id'))
+        .values(current_occupancy=case((new_occupancy > 0, new_occupancy), else_=0)),
+        [{'b_room_id': room_id, 'b_delta': delta} for room_id, delta in deltas.items()]
+    )
+
+
+def batch_checkout(assignment_ids):
+    """批量退宿，已退宿或不存在的分配记录会被跳过
+
+    返回 {'checkedOut', 'skipped', 'roomIds'}，由调用方提交事务
+    """
+    assignment_ids = list(set(assignment_ids))
+    rows = db.session.query(DormitoryAssignment.id, DormitoryAssignment.room_id)\
+        .filter(
+            DormitoryAssignment.id.in_(assignment_ids),
+            DormitoryAssignment.status == 'active'
+        ).with_for_update().all()
+
+    deltas = {}
+    for _, room_id in rows:
+        deltas[room_id] = deltas.get(room_id, 0) - 1
+
+    if rows:
+        now = datetime.now()
+        db.session.execute(
+            update(DormitoryAssignment)
+            .where(DormitoryAssignment.id.in_([row.id for row in rows]))
+            .values(status='inactive', check_out_date=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        _apply_occupancy_deltas(deltas)
+
+    return {
+        'checkedOut': len(rows),
+        'skipped': len(assignment_ids) - len(rows),
+        'roomIds': list(deltas)
+    }
+
+
+def batch_change_rooms(moves):
+    """批量调整宿舍，moves 为 (分配记录ID, 新房间ID) 列表
+
+    性别、状态与容量校验均基于集合查询完成；同一批次内搬出的床位可供其他学生搬入。
+    返回 {'changed', 'failed', 'errors', 'roomIds'}，由调用方提交事务
+    """
+    assignment_ids = {assignment_id for assignment_id, _ in moves}
+    room_ids = {room_id for _, room_id in moves}
+
+    assignments = {
+        row.id: row for row in db.session.query(
+            DormitoryAssignment.id,
+            DormitoryAssignment.student_id,
+            DormitoryAssignment.room_id,
+            DormitoryAssignment.status,
+            User.gender
+        ).join(Student, DormitoryAssignment.student_id == Student.id)
+        .join(User, Student.user_id == User.id)
+        .filter(DormitoryAssignment.id.in_(assignment_ids))
+        .with_for_update(of=DormitoryAssignment)
+        .all()
+    }
+    rooms = {
+        row.id: row for row in db.session.query(
+            DormitoryRoom.id,
+            DormitoryRoom.capacity,
+            DormitoryRoom.current_occupancy,
+            DormitoryBuilding.gender
+        ).join(DormitoryBuilding, DormitoryRoom.building_id == DormitoryBuilding.id)
+        .filter(DormitoryRoom.id.in_(room_ids))
+        .with_for_update(of=DormitoryRoom)
+        .all()
+    }
+
+    errors = []
+    candidates = []
+    seen = set()
+    for assignment_id, room_id in moves:
+        assignment = assignments.get(assignment_id)
+        room = rooms.get(room_id)
+        if not assignment:
+            errors.append(f'分配记录{assignment_id}：不存在')
+        elif assignment.status != 'active':
+            errors.append(f'分配记录{assignment_id}：该学生已退宿')
+        elif assignment_id in seen:
+            errors.append(f'分配记录{assignment_id}：重复调整')
+        elif not room:
+            errors.append(f'分配记录{assignment_id}：新宿舍不存在')
+        elif assignment.room_id == room_id:
+            errors.append(f'分配记录{assignment_id}：新宿舍与原宿舍相同')
+        elif assignment.gender != room.gender:
+            errors.append(f'分配记录{assignment_id}：学生性别与宿舍楼性别不匹配')
+        else:
+            candidates.append((assignment, room))
+        seen.add(assignment_id)
+
+    # 搬出的床位计入可用床位，被拒绝的调整不再释放床位，反复校验直到结果稳定
+    accepted = candidates
+    full = []
+    while True:
+        departures = {}
+        for assignment, _ in accepted:
+            departures[assignment.room_id] = departures.get(assignment.room_id, 0) + 1
+        arrivals = {}
+        kept = []
+        for assignment, room in accepted:
+            free_beds = room.capacity - room.current_occupancy + departures.get(room.id, 0)
+            if arrivals.get(room.id, 0) < free_beds:
+                arrivals[room.id] = arrivals.get(room.id, 0) + 1
+                kept.append((assignment, room))
+            else:
+                full.append(assignment.id)
+        if len(kept) == len(accepted):
+            break
+        accepted = kept
+    errors.extend(f'分配记录{assignment_id}：新宿舍已满' for assignment_id in sorted(full))
+
+    deltas = {}
+    if accepted:
+        now = datetime.now()
+        db.session.execute(
+            update(DormitoryAssignment)
+            .where(DormitoryAssignment.id.in_([assignment.id for assignment, _ in accepted]))
+            .values(status='inactive', check_out_date=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        new_assignments = [{
+            'student_id': assignment.student_id,
+            'room_id': room.id,
+            'check_in_date': now,
+            'status': 'active',
+            'created_at': now,
+            'updated_at': now
+        } for assignment, room in accepted]
+        for i in range(0, len(new_assignments), ALLOCATION_CHUNK_SIZE):
+            db.session.execute(insert(DormitoryAssignment), new_assignments[i:i + ALLOCATION_CHUNK_SIZE])
+
+        for assignment, room in accepted:
+            deltas[assignment.room_id] = deltas.get(assignment.room_id, 0) - 1
+            deltas[room.id] = deltas.get(room.id, 0) + 1
+        _apply_occupancy_deltas(deltas)
+
+    return {
+        'changed': len(accepted),
+        'failed': len(moves) - len(accepted),
+        'errors': errors,
+        'roomIds': list(deltas)
+    }
@@ -9,9 +9,25 @@ from openpyxl import load_workbook
 from io import BytesIO
 from app.models.class_info import ClassInfo
 from app.models.score import Score
+from app.utils.ranking import index_scores
+from sqlalchemy import insert
+from functools import lru_cache
 
-def process_teacher_excel(file):
-    """处理教师Excel文件"""
+IMPORT_CHUNK_SIZE = 500  # 批量查询/插入的分块大小
+DEFAULT_PASSWORD = '123456'
+
+
+@lru_cache(maxsize=1)
+def default_password_hash():
+    """默认密码的哈希，每个进程只计算一次
+
+    批量导入的账号共用该凭据，并标记为首次登录必须修改密码
+    """
+    return generate_password_hash(DEFAULT_PASSWORD)
+
+
+def process_teacher_excel(file, progress=None):
+    """处理教师Excel文件，progress 为可选的进度回调"""
     try:
         # 读取Excel文件
         df = pd.read_excel(file)
@@ -51,10 +67,11 @@ def process_teacher_excel(file):
                     gender=row.get('性别'),
                     contact=row.get('联系方式'),
                     province=row.get('省份'),
-                    is_active=True
+                    is_active=True,
+                    # 使用预先计算的默认密码哈希，首次登录需修改
+                    password_hash=default_password_hash(),
+                    must_change_password=True
                 )
-                # 设置默认密码为123456
-                user.set_password('123456')
 
                 # 创建教师信息
                 teacher = Teacher(
@@ -73,6 +90,10 @@ def process_teacher_excel(file):
                 failed += 1
                 continue
 
+            finally:
+                if progress and (index + 1) % IMPORT_CHUNK_SIZE == 0:
+                    progress(total, index + 1, success, failed, errors)
+
         # 提交事务
         if success > 0:
             db.session.commit()
@@ -88,81 +109,123 @@ def process_teacher_excel(file):
         db.session.rollback()
         raise e
 
-def process_student_excel(file):
-    """处理学生Excel文件"""
-    try:
-        df = pd.read_excel(file)
-        df.columns = [col.strip('*') for col in df.columns]
-        total = len(df)
-        success = 0
-        failed = 0
-        errors = []
-
-        for index, row in df.iterrows():
-            try:
-                # 检查必需字段
-                required_fields = ['用户名', '邮箱', '姓名', '专业', '学号', '入学年份']
-                for field in required_fields:
-                    if pd.isna(row[field]):
-                        errors.append(f"第{index+1}行：缺少必需字段: {field}")
-                        failed += 1
-                        continue
-
-                # 检查用户名和邮箱是否已存在
-                if User.query.filter_by(username=row['用户名']).first():
-                    errors.append(f"第{index+1}行：用户名已存在")
-                    failed += 1
-                    continue
-
-                if User.query.filter_by(email=row['邮箱']).first():
-                    errors.append(f"第{index+1}行：邮箱已存在")
-                    failed += 1
-                    continue
-
-                # 检查学号是否已存在
-                if Student.query.filter_by(student_id=row['学号']).first():
-                    errors.append(f"第{index+1}行：学号已存在")
-                    failed += 1
-                    continue
+def _cell_value(value):
+    """将 pandas 单元格值转换为可入库的值，空值返回 None"""
+    if pd.isna(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
 
-                # 创建用户
-                user = User(
-                    username=row['用户名'],
-                    email=row['邮箱'],
-                    name=row['姓名'],
-                    role='student',
-                    gender=row.get('性别'),
-                    contact=row.get('联系方式'),
-                    province=row.get('省份'),
-                    is_active=True
-                )
-                user.set_password('123456')
 
-                # 设置入学日期和预计毕业日期
-                admission_year = int(row['入学年份'])
-                admission_date = datetime(admission_year, 9, 1)  # 9月1日入学
-                graduation_date = datetime(admission_year + 4, 6, 30)  # 4年后6月30日毕业
+def _find_existing(column, values):
+    """分块执行 IN 查询，返回数据库中已存在的值集合（统一转为小写）
 
-                # 创建学生信息
-                student = Student(
-                    user=user,
-                    student_id=row['学号'],
-                    major=row['专业'],
-                    admission_year=admission_year,
-                    admission_date=admission_date,
-                    graduation_date=graduation_date,
-                    status='pending'
-                )
+    MySQL 默认排序规则不区分大小写，Alice 与 alice 会命中同一唯一索引，
+    因此调用方也需用小写值比较
+    """
+    values = list(values)
+    existing = set()
+    for i in range(0, len(values), IMPORT_CHUNK_SIZE):
+        chunk = values[i:i + IMPORT_CHUNK_SIZE]
+        existing.update(value.lower() for (value,) in db.session.query(column).filter(column.in_(chunk)))
+    return existing
 
-                db.session.add(user)
-                db.session.add(student)
-                success += 1
 
-            except Exception as e:
-                errors.append(f"第{index+1}行：{str(e)}")
-                failed += 1
-                continue
+def process_student_excel(file, progress=None):
+    """处理学生Excel文件，progress 为可选的进度回调
 
+    整表向量化校验：每个唯一性字段只执行一次 IN 查询（同时检查文件内重复），
+    通过校验的行按块批量插入用户和学生记录
+    """
+    try:
+        df = pd.read_excel(file)
+        df.columns = [col.strip('*') for col in df.columns]
+        total = len(df)
+        row_errors = {}
+
+        def fail(mask, message):
+            for index in df.index[mask]:
+                row_errors.setdefault(index, message(index) if callable(message) else message)
+
+        # 检查必需字段
+        required_fields = ['用户名', '邮箱', '姓名', '专业', '学号', '入学年份']
+        missing = df[required_fields].isna()
+        first_missing = missing.idxmax(axis=1)
+        fail(missing.any(axis=1), lambda index: f"缺少必需字段: {first_missing[index]}")
+
+        # 统一唯一性字段格式
+        for field in ['用户名', '邮箱', '学号']:
+            df[field] = df[field].map(_cell_value)
+
+        # 入学年份必须为整数
+        admission_years = pd.to_numeric(df['入学年份'], errors='coerce')
+        fail(admission_years.isna() & ~missing['入学年份'], "入学年份格式错误")
+
+        # 检查用户名、邮箱、学号是否已存在（数据库或文件内重复）
+        for field, column, label in [
+            ('用户名', User.username, '用户名'),
+            ('邮箱', User.email, '邮箱'),
+            ('学号', Student.student_id, '学号'),
+        ]:
+            keys = df[field].str.lower()  # 与数据库一致，按不区分大小写比较
+            valid = ~df.index.isin(list(row_errors))
+            existing = _find_existing(column, df.loc[valid, field].unique())
+            fail(valid & keys.isin(existing), f"{label}已存在")
+            valid = ~df.index.isin(list(row_errors))
+            duplicated = keys[valid].duplicated(keep='first')
+            fail(df.index.isin(duplicated[duplicated].index), f"{label}在文件中重复")
+
+        # 组装待插入数据
+        valid_rows = df[~df.index.isin(list(row_errors))]
+        user_rows = []
+        student_rows = []
+        for index, row in valid_rows.iterrows():
+            admission_year = int(admission_years[index])
+            user_rows.append({
+                'username': row['用户名'],
+                'email': row['邮箱'],
+                'name': _cell_value(row['姓名']),
+                'role': 'student',
+                'gender': _cell_value(row.get('性别')),
+                'contact': _cell_value(row.get('联系方式')),
+                'province': _cell_value(row.get('省份')),
+                'is_active': True,
+                'password_hash': default_password_hash(),
+                'must_change_password': True
+            })
+            student_rows.append({
+                'student_id': row['学号'],
+                'major': _cell_value(row['专业']),
+                'admission_year': admission_year,
+                'admission_date': datetime(admission_year, 9, 1),  # 9月1日入学
+                'graduation_date': datetime(admission_year + 4, 6, 30),  # 4年后6月30日毕业
+                'status': 'pending'
+            })
+
+        failed = len(row_errors)
+        errors = [f"第{index+1}行：{message}" for index, message in sorted(row_errors.items())]
+        if progress:
+            progress(total, failed, 0, failed, errors)
+
+        # 分块批量插入用户，再回查用户ID插入学生信息
+        for i in range(0, len(user_rows), IMPORT_CHUNK_SIZE):
+            user_chunk = user_rows[i:i + IMPORT_CHUNK_SIZE]
+            student_chunk = student_rows[i:i + IMPORT_CHUNK_SIZE]
+            db.session.execute(insert(User), user_chunk)
+            user_ids = dict(
+                db.session.query(User.username, User.id)
+                .filter(User.username.in_([row['username'] for row in user_chunk]))
+                .all()
+            )
+            for user_row, student_row in zip(user_chunk, student_chunk):
+                student_row['user_id'] = user_ids[user_row['username']]
+            db.session.execute(insert(Student), student_chunk)
+            if progress:
+                inserted = i + len(user_chunk)
+                progress(total, failed + inserted, inserted, failed, errors)
+
+        success = len(user_rows)
         if success > 0:
             db.session.commit()
 
@@ -177,12 +240,33 @@ def process_student_excel(file):
         db.session.rollback()
         raise e
 
-def process_student_score_excel(file_data: bytes, class_id: int, teacher_id: int):
-    """处理学生成绩导入"""
+SCORE_SUBJECTS = ('chinese', 'math', 'english', 'physics', 'chemistry', 'biology')
+SCORE_COLUMNS = 9  # 学号、姓名、年份 + 六科成绩
+
+
+def validate_score_row(row):
+    """校验成绩模板中的一行，返回成绩字段字典，校验失败抛出 ValueError
+
+    row 依次为：学号、姓名、年份、语文、数学、英语、物理、化学、生物
+    """
+    values = {'year': row[2]}
+    for subject, value in zip(SCORE_SUBJECTS, row[3:SCORE_COLUMNS]):
+        score = float(value or 0)
+        if not (0 <= score <= 150):
+            raise ValueError("成绩必须在0-150之间")
+        values[subject] = score
+    values['total_score'] = sum(values[subject] for subject in SCORE_SUBJECTS)
+    return values
+
+
+def process_student_score_excel(file_data: bytes, class_id: int, teacher_id: int, validator=validate_score_row):
+    """处理学生成绩导入
+
+    以只读模式流式读取工作表，内存占用与表格大小无关；
+    班级学生和已有成绩预先各用一次查询载入，成绩记录分块批量插入；
+    validator 负责把一行原始值转换为成绩字段，可按需替换
+    """
     try:
-        wb = load_workbook(BytesIO(file_data))
-        ws = wb.active
-        errors = []
         results = {
             'total': 0,
             'success': 0,
@@ -196,79 +280,76 @@ def process_student_score_excel(file_data: bytes, class_id: int, teacher_id: int
             teacher_id=teacher_id
         ).first()
         if not class_info:
-            errors.append("未找到班级信息")
+            results['errors'].append("未找到班级信息")
             results['failed'] += 1
             return results
 
-        # 从第二行开始处理数据
-        for row in range(2, ws.max_row + 1):
-            try:
-                student_id = ws[f'A{row}'].value
-                if not student_id:  # 跳过空行
-                    continue
-                    
-                results['total'] += 1
-                
-                # 获取学生信息
-                student = Student.query.filter_by(
-                    student_id=student_id,
-                    class_id=class_id
-                ).first()
-                
-                if not student:
-                    errors.append(f"第{row}行：未找到学生: {student_id}")
-                    results['failed'] += 1
-                    continue
+        # 预先加载班级学生及已有成绩的学生，逐行校验只查内存
+        class_students = {
+            _cell_value(student_number): (student_pk, major)
+            for student_number, student_pk, major in db.session.query(
+                Student.student_id, Student.id, Student.major
+            ).filter(Student.class_id == class_id)
+        }
+        scored_ids = {
+            student_pk for (student_pk,) in db.session.query(Score.student_id)
+            .join(Student, Score.student_id == Student.id)
+            .filter(Student.class_id == class_id)
+        }
 
-                # 检查是否已有成绩记录
-                existing_score = Score.query.filter_by(student_id=student.id).first()
-                if existing_score:
-                    errors.append(f"第{row}行：学生 {student_id} 已有成绩记录")
-                    results['failed'] += 1
-                    continue
+        score_rows = []
+        imported = []
+        wb = load_workbook(BytesIO(file_data), read_only=True, data_only=True)
+        try:
+            ws = wb.active
+            # 从第二行开始处理数据
+            rows = ws.iter_rows(min_row=2, max_col=SCORE_COLUMNS, values_only=True)
+            for row_number, row in enumerate(rows, start=2):
+                try:
+                    row = tuple(row) + (None,) * (SCORE_COLUMNS - len(row))
+                    student_id = row[0]
+                    if not student_id:  # 跳过空行
+                        continue
+
+                    results['total'] += 1
 
-                # 获取各科成绩
-                chinese = float(ws[f'D{row}'].value or 0)
-                math = float(ws[f'E{row}'].value or 0)
-                english = float(ws[f'F{row}'].value or 0)
-                physics = float(ws[f'G{row}'].value or 0)
-                chemistry = float(ws[f'H{row}'].value or 0)
-                biology = float(ws[f'I{row}'].value or 0)
-
-                # 验证成绩范围
-                scores = [chinese, math, english, physics, chemistry, biology]
-                for score in scores:
-                    if not (0 <= score <= 150):
-                        errors.append(f"第{row}行：成绩必须在0-150之间")
+                    # 获取学生信息
+                    student = class_students.get(_cell_value(student_id))
+                    if not student:
+                        results['errors'].append(f"第{row_number}行：未找到学生: {student_id}")
                         results['failed'] += 1
                         continue
+                    student_pk, major = student
 
-                # 计算总分
-                total_score = sum(scores)
-
-                # 创建成绩记录
-                score = Score(
-                    student_id=student.id,
-                    year=ws[f'C{row}'].value,
-                    total_score=total_score,
-                    chinese=chinese,
-                    math=math,
-                    english=english,
-                    physics=physics,
-                    chemistry=chemistry,
-                    biology=biology
-                )
-                db.session.add(score)
-                results['success'] += 1
+                    # 检查是否已有成绩记录（包括本文件中已出现的学生）
+                    if student_pk in scored_ids:
+                        results['errors'].append(f"第{row_number}行：学生 {student_id} 已有成绩记录")
+                        results['failed'] += 1
+                        continue
 
-            except Exception as e:
-                results['failed'] += 1
-                results['errors'].append(f"第{row}行: {str(e)}")
-                continue
+                    values = validator(row)
 
+                    # 暂存成绩记录，统一批量插入
+                    score_rows.append(dict(values, student_id=student_pk))
+                    scored_ids.add(student_pk)
+                    imported.append((student_pk, major, values['total_score']))
+                    results['success'] += 1
+
+                except Exception as e:
+                    results['failed'] += 1
+                    results['errors'].append(f"第{row_number}行：{str(e)}")
+                    continue
+        finally:
+            wb.close()
+
+        for i in range(0, len(score_rows), IMPORT_CHUNK_SIZE):
+            db.session.execute(insert(Score), score_rows[i:i + IMPORT_CHUNK_SIZE])
         db.session.commit()
+
+        # 同步排名索引
+        index_scores(imported)
         return results
 
     except Exception as e:
         db.session.rollback()
-        raise ValueError(f"处理Excel文件失败: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"处理Excel文件失败: {str(e)}")
@@ -0,0 +1,75 @@
+import atexit
+import os
+import uuid
+from functools import wraps
+from flask import current_app
+from app.extensions import redis_client
+from redis.exceptions import RedisError
+
+# 多个 worker 进程通过 Redis 锁选出一个领导者执行定时任务，锁过期后其他进程自动接管
+LEADER_KEY = 'scheduler:leader'
+
+# 仅当锁仍由自己持有时续期/释放
+_RENEW_SCRIPT = redis_client.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+""")
+_RELEASE_SCRIPT = redis_client.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+""")
+
+_token = None
+_token_pid = None
+
+
+def _get_token():
+    """进程级标识，fork 出的子进程会重新生成"""
+    global _token, _token_pid
+    if _token_pid != os.getpid():
+        _token = f'{os.getpid()}:{uuid.uuid4().hex}'
+        _token_pid = os.getpid()
+    return _token
+
+
+def is_leader(ttl=None):
+    """抢占或续期领导者锁，当前进程为领导者时返回 True
+
+    Redis 不可用时退化为每个进程各自执行
+    """
+    ttl = ttl or current_app.config['SCHEDULER_LEADER_TTL']
+    token = _get_token()
+    try:
+        if redis_client.set(LEADER_KEY, token, nx=True, ex=ttl):
+            return True
+        return bool(_RENEW_SCRIPT(keys=[LEADER_KEY], args=[token, ttl]))
+    except RedisError as e:
+        print(f"Scheduler leader election error: {str(e)}")
+        return True
+
+
+def release_leadership():
+    """进程退出时主动释放锁，便于其他进程尽快接管"""
+    if _token_pid != os.getpid():
+        return
+    try:
+        _RELEASE_SCRIPT(keys=[LEADER_KEY], args=[_token])
+    except RedisError as e:
+        print(f"Release scheduler leader error: {str(e)}")
+
+
+atexit.register(release_leadership)
+
+
+def leader_only(func):
+    """定时任务装饰器：未开启选举或当前进程为领导者时才执行"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if current_app.config['SCHEDULER_LEADER_ELECTION'] and not is_leader():
+            return None
+        return func(*args, **kwargs)
+    return wrapper
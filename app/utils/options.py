@@ -0,0 +1,42 @@
+import hashlib
+import json
+from app.extensions import db
+from app.models.class_info import ClassInfo
+from app.utils.cache import get_cached, invalidate
+from app.utils.settings import load_settings
+
+OPTIONS_CACHE_KEY = 'options:teacher'
+OPTIONS_CACHE_TTL = 3600  # 兜底过期时间，正常由设置或班级变更主动清除
+
+
+def build_options():
+    """生成院系、专业、年级选项及其 ETag
+
+    直接读取数据库中的设置：进程内设置快照可能尚未感知其他进程的修改，
+    用它生成的旧数据会随缓存一起保留到过期
+    """
+    settings = load_settings()
+    years = db.session.query(ClassInfo.year)\
+        .distinct()\
+        .order_by(ClassInfo.year.desc())\
+        .all()
+    data = {
+        'departments': settings.departments,  # 院系选项
+        'majors': settings.majors,          # 专业选项
+        'years': [year[0] for year in years]
+    }
+    content = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return {
+        'data': data,
+        'etag': hashlib.sha1(content.encode('utf-8')).hexdigest()
+    }
+
+
+def get_options():
+    """获取缓存的选项数据，返回 {'data', 'etag'}"""
+    return get_cached(OPTIONS_CACHE_KEY, build_options, ttl=OPTIONS_CACHE_TTL)
+
+
+def invalidate_options_cache():
+    """系统设置或班级变更后清除选项缓存"""
+    invalidate(OPTIONS_CACHE_KEY)
@@ -0,0 +1,72 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, or_
+from app.extensions import db
+from app.utils.cache import get_cached
+
+COUNT_CACHE_KEY = 'count:{}'
+
+
+def encode_cursor(values):
+    """将排序列的取值编码为不透明的游标字符串"""
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, columns):
+    """解析游标，格式不正确时抛出 ValueError"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        raise ValueError('无效的分页游标')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('无效的分页游标')
+    decoded = []
+    for column, value in zip(columns, values):
+        if isinstance(column.type, db.DateTime) and value is not None:
+            value = datetime.fromisoformat(value)
+        decoded.append(value)
+    return decoded
+
+
+def _after(columns, values, descending):
+    """构造 (a, b) 严格位于游标之后的条件：a > x OR (a = x AND b > y)"""
+    clauses = []
+    for i, column in enumerate(columns):
+        compare = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*[columns[j] == values[j] for j in range(i)], compare))
+    return or_(*clauses)
+
+
+def keyset_page(query, columns, cursor=None, limit=20, descending=False):
+    """按游标分页，columns 为排序列（最后一列须唯一，如主键）
+
+    返回 (本页记录, 下一页游标)；没有下一页时游标为 None
+    """
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, columns), descending))
+    order = [column.desc() if descending else column.asc() for column in columns]
+    items = query.order_by(*order).limit(limit + 1).all()
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column in columns])
+    return items, next_cursor
+
+
+def cached_count(query):
+    """缓存查询的总条数，供游标分页展示近似总数"""
+    compiled = query.order_by(None).statement.compile()
+    digest = hashlib.sha1(
+        (str(compiled) + repr(sorted(compiled.params.items(), key=lambda item: item[0]))).encode()
+    ).hexdigest()
+    return get_cached(
+        COUNT_CACHE_KEY.format(digest),
+        lambda: query.order_by(None).count(),
+        ttl=current_app.config['COUNT_CACHE_TTL']
+    )
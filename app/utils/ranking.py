@@ -0,0 +1,153 @@
+from app.extensions import db, redis_client
+from app.models.score import Score
+from app.models.student import Student
+from redis.exceptions import RedisError
+
+# 排名索引使用 Redis 有序集合：成员为学生ID，分值为总分
+SCHOOL_RANK_KEY = 'rank:school'
+MAJOR_RANK_KEY = 'rank:major:{}'
+RANK_READY_KEY = 'rank:ready'
+
+
+def _major_key(major):
+    return MAJOR_RANK_KEY.format(major or '')
+
+
+def rebuild_rank_index():
+    """根据成绩表重建全部排名索引"""
+    rows = db.session.query(Score.student_id, Student.major, Score.total_score)\
+        .join(Student, Score.student_id == Student.id)\
+        .all()
+
+    old_keys = list(redis_client.scan_iter(match=MAJOR_RANK_KEY.format('*')))
+    pipe = redis_client.pipeline()
+    if old_keys:
+        pipe.delete(*old_keys)
+    pipe.delete(SCHOOL_RANK_KEY)
+    for student_id, major, total_score in rows:
+        pipe.zadd(SCHOOL_RANK_KEY, {student_id: total_score})
+        pipe.zadd(_major_key(major), {student_id: total_score})
+    pipe.set(RANK_READY_KEY, 1)
+    pipe.execute()
+
+
+def _ensure_rank_index():
+    if redis_client.exists(RANK_READY_KEY):
+        return
+    # 加锁避免并发请求同时重建
+    with redis_client.lock('rank:rebuild', timeout=60, blocking_timeout=30):
+        if not redis_client.exists(RANK_READY_KEY):
+            rebuild_rank_index()
+
+
+def index_scores(entries):
+    """批量写入排名索引，entries 为 (学生ID, 专业, 总分) 元组"""
+    try:
+        if not redis_client.exists(RANK_READY_KEY):
+            # 索引尚未建立，首次查询时会整体重建
+            return
+        pipe = redis_client.pipeline()
+        for student_id, major, total_score in entries:
+            pipe.zadd(SCHOOL_RANK_KEY, {student_id: total_score})
+            pipe.zadd(_major_key(major), {student_id: total_score})
+        pipe.execute()
+    except RedisError as e:
+        print(f"Index scores error: {str(e)}")
+        invalidate_rank_index()
+
+
+def remove_from_rank_index(student_id, major):
+    """从排名索引中移除学生"""
+    try:
+        pipe = redis_client.pipeline()
+        pipe.zrem(SCHOOL_RANK_KEY, student_id)
+        pipe.zrem(_major_key(major), student_id)
+        pipe.execute()
+    except RedisError as e:
+        print(f"Remove rank index error: {str(e)}")
+        invalidate_rank_index()
+
+
+def move_major_rank(student_id, old_major, new_major, total_score):
+    """学生转专业时迁移专业排名索引"""
+    try:
+        pipe = redis_client.pipeline()
+        pipe.zrem(_major_key(old_major), student_id)
+        pipe.zadd(_major_key(new_major), {student_id: total_score})
+        pipe.execute()
+    except RedisError as e:
+        print(f"Move major rank error: {str(e)}")
+        invalidate_rank_index()
+
+
+def invalidate_rank_index():
+    """标记排名索引失效，下次查询时重建"""
+    try:
+        redis_client.delete(RANK_READY_KEY)
+    except RedisError as e:
+        print(f"Invalidate rank index error: {str(e)}")
+
+
+def _rank_from_db(student, by_major=False):
+    """Redis 不可用时，使用单条计数查询计算排名"""
+    query = db.session.query(
+        db.func.count(Score.id),
+        db.func.sum(db.case((Score.total_score > student.score[0].total_score, 1), else_=0))
+    )
+    if by_major:
+        query = query.join(Student, Score.student_id == Student.id)\
+            .filter(Student.major == student.major)
+    total, higher = query.one()
+    return int(higher or 0) + 1, int(total or 0)
+
+
+def get_rank(student, by_major=False):
+    """获取学生排名，返回 (名次, 参与排名人数)；by_major 为真时为专业排名"""
+    key = _major_key(student.major) if by_major else SCHOOL_RANK_KEY
+    try:
+        _ensure_rank_index()
+        pipe = redis_client.pipeline()
+        pipe.zrevrank(key, student.id)
+        pipe.zcard(key)
+        rank, total = pipe.execute()
+        if rank is not None:
+            return rank + 1, total
+    except RedisError as e:
+        print(f"Get rank error: {str(e)}")
+    return _rank_from_db(student, by_major)
+
+
+SUBJECTS = ('chinese', 'math', 'english', 'physics', 'chemistry', 'biology')
+
+
+def get_subject_analysis(student):
+    """一次查询获取专业内各科平均分及该学生的单科排名
+
+    返回 (平均分字典, 排名字典)，学生无成绩时排名字典为空
+    """
+    columns = [Score.student_id]
+    for subject in SUBJECTS:
+        column = getattr(Score, subject)
+        columns.append(db.func.rank().over(order_by=column.desc()).label(f'{subject}_rank'))
+        columns.append(db.func.avg(column).over().label(f'{subject}_avg'))
+
+    ranked = db.session.query(*columns)\
+        .join(Student, Score.student_id == Student.id)\
+        .filter(Student.major == student.major)\
+        .subquery()
+    row = db.session.query(ranked)\
+        .filter(ranked.c.student_id == student.id)\
+        .first()
+
+    if not row:
+        return {subject: 0.0 for subject in SUBJECTS}, {}
+
+    average_scores = {
+        subject: float(getattr(row, f'{subject}_avg') or 0)
+        for subject in SUBJECTS
+    }
+    subject_ranks = {
+        subject: getattr(row, f'{subject}_rank')
+        for subject in SUBJECTS
+    }
+    return average_scores, subject_ranks
@@ -1,9 +1,29 @@
-from app.extensions import db
+import threading
+import time
+from app.extensions import db, redis_client
 from app.models.settings import Settings
 from flask import current_app
+from redis.exceptions import RedisError
 
-def get_settings():
-    """获取系统设置，如果不存在则创建默认设置"""
+# 系统设置在进程内缓存为只读快照，修改后递增 Redis 中的版本号通知其他进程重新加载
+SETTINGS_VERSION_KEY = 'settings:version'
+
+_snapshot = None
+_snapshot_version = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+class SettingsSnapshot:
+    """系统设置的只读快照，属性与 Settings 模型一致，不要修改其中的列表"""
+
+    to_dict = Settings.to_dict
+
+    def __init__(self, settings):
+        for column in Settings.__table__.columns:
+            setattr(self, column.key, getattr(settings, column.key))
+
+def load_settings():
+    """从数据库获取系统设置，如果不存在则创建默认设置"""
     settings = Settings.query.first()
     if not settings:
         settings = Settings()
@@ -11,6 +31,44 @@ def get_settings():
         db.session.commit()
     return settings
 
+def _current_version():
+    try:
+        return redis_client.get(SETTINGS_VERSION_KEY) or '0'
+    except RedisError as e:
+        print(f"Get settings version error: {str(e)}")
+        return None
+
+def get_settings():
+    """获取缓存的系统设置快照
+
+    每隔 SETTINGS_CHECK_INTERVAL 秒检查一次版本号，其余时间直接返回进程内快照
+    """
+    global _snapshot, _snapshot_version, _checked_at
+    now = time.monotonic()
+    if _snapshot is not None and now - _checked_at < current_app.config['SETTINGS_CHECK_INTERVAL']:
+        return _snapshot
+
+    with _lock:
+        if _snapshot is not None and now - _checked_at < current_app.config['SETTINGS_CHECK_INTERVAL']:
+            return _snapshot
+        version = _current_version()
+        # Redis 不可用时 version 为 None，每个检查周期都从数据库重新加载
+        if _snapshot is None or version is None or version != _snapshot_version:
+            _snapshot = SettingsSnapshot(load_settings())
+            _snapshot_version = version
+        _checked_at = now
+    return _snapshot
+
+def notify_settings_changed():
+    """设置修改提交后调用：清除本进程快照并通知其他进程"""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+    try:
+        redis_client.incr(SETTINGS_VERSION_KEY)
+    except RedisError as e:
+        print(f"Notify settings changed error: {str(e)}")
+
 def get_setting(key):
     """获取单个设置项"""
     settings = get_settings()
@@ -18,9 +76,10 @@ def get_setting(key):
 
 def update_setting(key, value):
     """更新单个设置项"""
-    settings = get_settings()
+    settings = load_settings()
     if hasattr(settings, key):
         setattr(settings, key, value)
         db.session.commit()
+        notify_settings_changed()
         return True
-    return False 
\ No newline at end of file
+    return False
@@ -0,0 +1,124 @@
+from flask import current_app
+from datetime import datetime
+from app.extensions import db
+from app.models.user import User
+from app.models.student import Student
+from app.models.teacher import Teacher
+from app.models.class_info import ClassInfo
+from app.models.system_log import SystemLog
+from app.models.dormitory import DormitoryRoom
+from app.utils.cache import get_cached, invalidate
+
+OVERVIEW_CACHE_KEY = 'stats:overview'
+
+STATUS_LABELS = {
+    'reported': '已报到',
+    'unreported': '未报到',
+    'pending': '待报到'
+}
+
+
+def build_overview():
+    """计算系统概览的全局统计数据"""
+    # 各状态学生数量
+    status_counts = dict(
+        db.session.query(Student.status, db.func.count(Student.id))
+        .group_by(Student.status)
+        .all()
+    )
+    total_students = sum(status_counts.values())
+
+    # 宿舍统计
+    total_rooms = DormitoryRoom.query.count()
+    occupied_rooms = DormitoryRoom.query.filter(DormitoryRoom.current_occupancy > 0).count()
+
+    # 专业分布
+    major_stats = db.session.query(
+        Student.major,
+        db.func.count(Student.id).label('count')
+    ).group_by(Student.major).all()
+
+    # 省份分布
+    province_stats = db.session.query(
+        User.province,
+        db.func.count(Student.id).label('count')
+    ).join(Student, Student.user_id == User.id)\
+        .group_by(User.province)\
+        .all()
+    province_summary = {}
+    for province, count in province_stats:
+        province = province or '未知'
+        province_summary[province] = province_summary.get(province, 0) + count
+
+    return {
+        'studentStats': {
+            'total': total_students,
+            'reported': status_counts.get('reported', 0),
+            'unreported': status_counts.get('unreported', 0),
+            'pending': status_counts.get('pending', 0)
+        },
+        'teacherCount': Teacher.query.count(),
+        'dormitoryStats': {
+            'total': total_rooms,
+            'occupied': occupied_rooms,
+            'available': total_rooms - occupied_rooms
+        },
+        'majorDistribution': [{
+            'major': major,
+            'count': count
+        } for major, count in major_stats],
+        'provinceDistribution': [
+            {'province': k, 'count': v}
+            for k, v in province_summary.items()
+        ],
+        'stats': {
+            'studentCount': User.query.filter_by(role='student').count(),
+            'teacherCount': User.query.filter_by(role='teacher').count(),
+            'classCount': ClassInfo.query.count(),
+            'todayVisits': SystemLog.query.filter(
+                SystemLog.created_at >= datetime.now().date()
+            ).count()
+        }
+    }
+
+
+def query_student_details(after_id=0, limit=50):
+    """按学生ID做游标分页，查询学生省份明细"""
+    rows = db.session.query(
+        Student.id,
+        User.province,
+        Student.major,
+        Student.student_id,
+        User.name,
+        User.gender,
+        Student.status
+    ).join(User, Student.user_id == User.id)\
+        .filter(Student.id > after_id)\
+        .order_by(Student.id)\
+        .limit(limit)\
+        .all()
+
+    return [{
+        'id': row.id,
+        'province': row.province or '未知',
+        'major': row.major,
+        'studentId': row.student_id,
+        'name': row.name,
+        'gender': '男' if row.gender == 'M' else '女',
+        'status': STATUS_LABELS.get(row.status, '未知'),
+        'count': 1
+    } for row in rows]
+
+
+def get_overview_data():
+    """获取缓存的系统概览数据"""
+    return get_cached(
+        OVERVIEW_CACHE_KEY,
+        build_overview,
+        ttl=current_app.config['STATS_CACHE_TTL']
+    )
+
+
+def invalidate_overview_cache():
+    """学生、教师、宿舍等数据变更后清除概览缓存"""
+    invalidate(OVERVIEW_CACHE_KEY)
@@ -1,5 +1,8 @@
 import pandas as pd
-import os
+import json
+import hashlib
+import threading
+from io import BytesIO
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Protection
 from openpyxl.worksheet.datavalidation import DataValidation
@@ -11,7 +14,7 @@ from app.models.class_info import ClassInfo
 from app.models.score import Score
 from app.extensions import db
 
-def create_teacher_template():
+def create_teacher_template(settings):
     """创建教师导入模板"""
     try:
         wb = Workbook()
@@ -67,7 +70,6 @@ def create_teacher_template():
             cell.alignment = Alignment(horizontal='center')
 
         # 获取系统设置中的院系列表
-        settings = get_settings()
         departments = settings.departments
 
         # 创建数据验证
@@ -86,7 +88,7 @@ def create_teacher_template():
             ("邮箱格式", "必须是有效的邮箱格式"),
             ("性别填写", "M表示男性，F表示女性"),
             ("院系选项", "、".join(departments) if departments else "未设置院系"),
-            ("默认密码", "123456（用户可以登录后修改）"),
+            ("默认密码", "123456（首次登录后需修改密码）"),
             ("注意事项", "1. 请勿修改表头\n2. 示例数据仅供参考，可以删除\n3. 批量导入时请确保数据的准确性")
         ]
 
@@ -96,26 +98,11 @@ def create_teacher_template():
             if '\n' in content:
                 ws_help.row_dimensions[row].height = 45
 
-        # 保存模板
-        template_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'templates')
-        if not os.path.exists(template_dir):
-            os.makedirs(template_dir)
-        
-        template_path = os.path.join(template_dir, 'teacher_import_template.xlsx')
-        if os.path.exists(template_path):
-            os.remove(template_path)  # 删除已存在的文件
-        
-        try:
-            wb.save(template_path)
-            wb.close()
-        except Exception as e:
-            raise Exception(f"保存模板文件失败: {str(e)}")
-            
-        return template_path
+        return wb
     except Exception as e:
         raise Exception(f"创建模板失败: {str(e)}")
 
-def create_student_template():
+def create_student_template(settings):
     """创建学生导入模板"""
     try:
         wb = Workbook()
@@ -178,7 +165,6 @@ def create_student_template():
             cell.alignment = Alignment(horizontal='center')
 
         # 获取系统设置中的专业列表
-        settings = get_settings()
         majors = settings.majors
 
         # 添加说明sheet
@@ -194,7 +180,7 @@ def create_student_template():
             ("专业选项", "、".join(majors) if majors else "未设置专业"),
             ("学号要求", "唯一标识，不可重复"),
             ("入学年份", "四位数字年份，如：2023"),
-            ("默认密码", "123456（用户可以登录后修改）"),
+            ("默认密码", "123456（首次登录后需修改密码）"),
             ("注意事项", "1. 请勿修改表头\n2. 示例数据仅供参考，可以删除\n3. 批量导入时请确保数据的准确性")
         ]
 
@@ -204,22 +190,47 @@ def create_student_template():
             if '\n' in content:
                 ws_help.row_dimensions[row].height = 45
 
-        # 保存模板
-        template_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'templates')
-        if not os.path.exists(template_dir):
-            os.makedirs(template_dir)
-        
-        template_path = os.path.join(template_dir, 'student_import_template.xlsx')
-        if os.path.exists(template_path):
-            os.remove(template_path)
-        
-        wb.save(template_path)
-        wb.close()
-        return template_path
+        return wb
         
     except Exception as e:
         raise Exception(f"创建模板失败: {str(e)}")
 
+IMPORT_TEMPLATES = {
+    'teacher': create_teacher_template,
+    'student': create_student_template,
+}
+
+# 已生成的导入模板内容，键为 (模板类型, 系统设置摘要)
+_template_cache = {}
+_template_lock = threading.Lock()
+
+def _settings_digest(settings):
+    """计算系统设置内容的摘要，设置变化时摘要随之变化"""
+    content = json.dumps(settings.to_dict(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def get_import_template(kind):
+    """获取导入模板文件内容，仅在系统设置变化后重新生成"""
+    settings = get_settings()
+    cache_key = (kind, _settings_digest(settings))
+    content = _template_cache.get(cache_key)
+    if content is not None:
+        return content
+
+    with _template_lock:
+        content = _template_cache.get(cache_key)
+        if content is None:
+            wb = IMPORT_TEMPLATES[kind](settings)
+            output = BytesIO()
+            wb.save(output)
+            wb.close()
+            content = output.getvalue()
+            # 只保留当前设置版本的模板
+            for key in [key for key in _template_cache if key[0] == kind]:
+                del _template_cache[key]
+            _template_cache[cache_key] = content
+    return content
+
 def create_student_score_template(class_id: int, teacher_id: int):
     """创建学生成绩导入模板"""
     try:
@@ -0,0 +1,146 @@
+from app.extensions import db, redis_client
+from app.models.dormitory import DormitoryBuilding, DormitoryRoom
+from redis.exceptions import RedisError
+
+# 空床位索引：每栋宿舍楼一个有序集合，成员为房间ID，分值为剩余床位数（满员房间不入集合）
+VACANCY_KEY = 'dorm:vacancy:building:{}'
+VACANCY_BUILDINGS_KEY = 'dorm:vacancy:buildings'  # 宿舍楼ID -> 性别
+VACANCY_ROOMS_KEY = 'dorm:vacancy:rooms'  # 房间ID -> 房间号
+VACANCY_READY_KEY = 'dorm:vacancy:ready'
+
+
+def _room_rows(room_ids=None):
+    query = db.session.query(
+        DormitoryRoom.id,
+        DormitoryRoom.building_id,
+        DormitoryRoom.room_number,
+        DormitoryRoom.capacity,
+        DormitoryRoom.current_occupancy
+    )
+    if room_ids is not None:
+        query = query.filter(DormitoryRoom.id.in_(room_ids))
+    return query.all()
+
+
+def _index_room(pipe, row):
+    free_beds = (row.capacity or 0) - (row.current_occupancy or 0)
+    key = VACANCY_KEY.format(row.building_id)
+    if free_beds > 0:
+        pipe.zadd(key, {row.id: free_beds})
+    else:
+        pipe.zrem(key, row.id)
+    pipe.hset(VACANCY_ROOMS_KEY, row.id, row.room_number)
+
+
+def rebuild_vacancy_index():
+    """根据房间入住人数重建全部空床位索引"""
+    buildings = db.session.query(DormitoryBuilding.id, DormitoryBuilding.gender).all()
+    rows = _room_rows()
+
+    old_keys = list(redis_client.scan_iter(match=VACANCY_KEY.format('*')))
+    pipe = redis_client.pipeline()
+    if old_keys:
+        pipe.delete(*old_keys)
+    if buildings:
+        pipe.hset(VACANCY_BUILDINGS_KEY, mapping={
+            building_id: gender or '' for building_id, gender in buildings
+        })
+    for row in rows:
+        _index_room(pipe, row)
+    pipe.set(VACANCY_READY_KEY, 1)
+    pipe.execute()
+
+
+def _ensure_vacancy_index():
+    if redis_client.exists(VACANCY_READY_KEY):
+        return
+    # 加锁避免并发请求同时重建
+    with redis_client.lock('dorm:vacancy:rebuild', timeout=60, blocking_timeout=30):
+        if not redis_client.exists(VACANCY_READY_KEY):
+            rebuild_vacancy_index()
+
+
+def refresh_room_vacancy(*room_ids):
+    """分配、退宿、调宿提交后，按数据库中的最新入住人数刷新房间索引"""
+    room_ids = [room_id for room_id in room_ids if room_id]
+    if not room_ids:
+        return
+    try:
+        if not redis_client.exists(VACANCY_READY_KEY):
+            # 索引尚未建立，首次查询时会整体重建
+            return
+        pipe = redis_client.pipeline()
+        for row in _room_rows(room_ids):
+            _index_room(pipe, row)
+        pipe.execute()
+    except RedisError as e:
+        print(f"Refresh room vacancy error: {str(e)}")
+        invalidate_vacancy_index()
+
+
+def invalidate_vacancy_index():
+    """宿舍楼或房间增删改后标记索引失效，下次查询时重建"""
+    try:
+        redis_client.delete(VACANCY_READY_KEY, VACANCY_BUILDINGS_KEY, VACANCY_ROOMS_KEY)
+    except RedisError as e:
+        print(f"Invalidate vacancy index error: {str(e)}")
+
+
+def _vacant_rooms_from_db(gender, building_id, min_beds, limit):
+    """Redis 不可用时直接查询数据库"""
+    free_beds = DormitoryRoom.capacity - DormitoryRoom.current_occupancy
+    query = db.session.query(
+        DormitoryRoom.id,
+        DormitoryRoom.building_id,
+        DormitoryRoom.room_number,
+        free_beds.label('free_beds')
+    ).join(DormitoryBuilding, DormitoryRoom.building_id == DormitoryBuilding.id)\
+        .filter(free_beds >= min_beds)
+    if building_id:
+        query = query.filter(DormitoryRoom.building_id == building_id)
+    if gender:
+        query = query.filter(DormitoryBuilding.gender == gender)
+    rows = query.order_by(DormitoryRoom.building_id, free_beds, DormitoryRoom.id)\
+        .limit(limit)\
+        .all()
+    return [{
+        'roomId': row.id,
+        'buildingId': row.building_id,
+        'roomNumber': row.room_number,
+        'freeBeds': row.free_beds
+    } for row in rows]
+
+
+def find_vacant_rooms(gender=None, building_id=None, min_beds=1, limit=10):
+    """查找至少有 min_beds 个空床位的房间
+
+    按宿舍楼顺序返回，同一宿舍楼内剩余床位少的房间优先，尽量先住满房间
+    """
+    min_beds = max(min_beds, 1)
+    try:
+        _ensure_vacancy_index()
+        genders = redis_client.hgetall(VACANCY_BUILDINGS_KEY)
+        building_ids = sorted(int(key) for key, value in genders.items() if not gender or value == gender)
+        if building_id:
+            building_ids = [building_id] if building_id in building_ids else []
+
+        rooms = []
+        for current_id in building_ids:
+            members = redis_client.zrangebyscore(
+                VACANCY_KEY.format(current_id), min_beds, '+inf',
+                start=0, num=limit - len(rooms), withscores=True
+            )
+            rooms.extend((current_id, int(room_id), int(score)) for room_id, score in members)
+            if len(rooms) >= limit:
+                break
+
+        room_numbers = redis_client.hmget(VACANCY_ROOMS_KEY, [room_id for _, room_id, _ in rooms]) if rooms else []
+        return [{
+            'roomId': room_id,
+            'buildingId': current_id,
+            'roomNumber': room_number,
+            'freeBeds': free_beds
+        } for (current_id, room_id, free_beds), room_number in zip(rooms, room_numbers)]
+    except RedisError as e:
+        print(f"Find vacant rooms error: {str(e)}")
+    return _vacant_rooms_from_db(gender, building_id, min_beds, limit)
@@ -0,0 +1,21 @@
+"""add must_change_password to users
+
+Revision ID: add_must_change_password
+Revises: xxx
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_must_change_password'
+down_revision = 'xxx'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('users', sa.Column('must_change_password', sa.Boolean(), nullable=True, server_default=sa.false()))
+
+def downgrade():
+    op.drop_column('users', 'must_change_password')
@@ -0,0 +1,29 @@
+"""add current_occupancy to dormitory_rooms
+
+Revision ID: add_room_current_occupancy
+Revises: add_must_change_password
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_room_current_occupancy'
+down_revision = 'add_must_change_password'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('dormitory_rooms', sa.Column('current_occupancy', sa.Integer(), nullable=False, server_default='0'))
+    # 根据在住分配记录回填入住人数
+    op.execute("""
+        UPDATE dormitory_rooms SET current_occupancy = (
+            SELECT COUNT(*) FROM dormitory_assignments
+            WHERE dormitory_assignments.room_id = dormitory_rooms.id
+              AND dormitory_assignments.status = 'active'
+        )
+    """)
+
+def downgrade():
+    op.drop_column('dormitory_rooms', 'current_occupancy')
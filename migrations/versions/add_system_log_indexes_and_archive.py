@@ -0,0 +1,41 @@
+"""add system_logs indexes and system_logs_archive table
+
+Revision ID: add_system_log_archive
+Revises: add_room_current_occupancy
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_system_log_archive'
+down_revision = 'add_room_current_occupancy'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_system_logs_created_at', 'system_logs', ['created_at'])
+    op.create_index('ix_system_logs_type_created_at', 'system_logs', ['type', 'created_at'])
+    op.create_index('ix_system_logs_user_type_created_at', 'system_logs', ['user_id', 'type', 'created_at'])
+
+    op.create_table('system_logs_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('type', sa.String(length=50), nullable=True),
+        sa.Column('content', sa.Text(), nullable=True),
+        sa.Column('ip_address', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_system_logs_archive_created_at', 'system_logs_archive', ['created_at'])
+    op.create_index('ix_system_logs_archive_type_created_at', 'system_logs_archive', ['type', 'created_at'])
+
+def downgrade():
+    op.drop_index('ix_system_logs_archive_type_created_at', table_name='system_logs_archive')
+    op.drop_index('ix_system_logs_archive_created_at', table_name='system_logs_archive')
+    op.drop_table('system_logs_archive')
+
+    op.drop_index('ix_system_logs_user_type_created_at', table_name='system_logs')
+    op.drop_index('ix_system_logs_type_created_at', table_name='system_logs')
+    op.drop_index('ix_system_logs_created_at', table_name='system_logs')
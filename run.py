@@ -4,6 +4,9 @@ from app import db
 from datetime import datetime, timedelta
 import random
 from werkzeug.security import generate_password_hash
+from app.utils.ranking import invalidate_rank_index
+from app.utils.vacancy import invalidate_vacancy_index
+from app.utils.options import invalidate_options_cache
 
 app = create_app()
 
@@ -63,7 +66,8 @@ def init_db():
                             dorm_room = DormitoryRoom(
                                 room_number=room_number,
                                 building_id=building.id,
-                                capacity=4
+                                capacity=4,
+                                current_occupancy=0
                             )
                             db.session.add(dorm_room)
                 
@@ -110,7 +114,8 @@ def init_db():
                         building = building_m if gender == 'M' else building_f
                         # 随机选择一个房间
                         rooms = DormitoryRoom.query.filter_by(building_id=building.id).all()
-                        room = random.choice(rooms)
+                        room = random.choice([r for r in rooms if r.occupancy < r.capacity])
+                        room.current_occupancy = room.occupancy + 1
                         
                         # 创建宿舍分配记录
                         assignment = DormitoryAssignment(
@@ -132,6 +137,7 @@ def init_db():
                         db.session.add(log)
 
                 db.session.commit()
+                invalidate_vacancy_index()
                 print('初始化数据成功！')
                 print('管理员账号: admin')
                 print('密码: admin123')
@@ -210,6 +216,8 @@ def update_rankings():
                 score.major_rank = rank
         
         db.session.commit()
+        # 测试数据绕过了成绩接口，标记排名索引待重建
+        invalidate_rank_index()
         print("排名更新完成!")
         
     except Exception as e:
@@ -328,6 +336,7 @@ def create_class_data():
                 random_class.assigned_students += 1  # 更新已分配学生数量
             
             db.session.commit()
+            invalidate_options_cache()
             print("班级测试数据创建完成!")
             
         except Exception as e: